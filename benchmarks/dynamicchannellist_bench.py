@@ -0,0 +1,434 @@
+"""
+Offline benchmarks for DynamicChannelList.
+
+Builds synthetic guilds out of small stand-ins for the discord.py objects the cog uses,
+replaces the REST layer and Config with in-memory versions, and measures the wall time,
+memory allocations and simulated API calls of the hot paths.
+Results are written as JSON so runs can be compared.
+
+Requires discord.py and Red to be installed, run from the root of the repo:
+`python benchmarks/dynamicchannellist_bench.py --channels 500 --output bench.json`
+"""
+import argparse
+import asyncio
+import contextlib
+import copy
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+import discord
+from redbot.core import Config
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from dynamicchannellist.dynamicchannellist import DynamicChannelList
+
+
+_ids = itertools.count(100000000000000000)
+
+
+class FakeResponse:
+	"""Stand-in for the aiohttp response discord.py errors expect."""
+	def __init__(self, status):
+		self.status = status
+		self.reason = 'Simulated'
+
+
+class FakeREST:
+	"""Counts the API calls made by the cog, optionally sleeping to simulate latency."""
+	def __init__(self, latency=0):
+		self.latency = latency
+		self.calls = {'send': 0, 'fetch': 0, 'edit': 0, 'delete': 0}
+
+	async def call(self, kind):
+		self.calls[kind] += 1
+		if self.latency:
+			await asyncio.sleep(self.latency)
+
+	def reset(self):
+		for kind in self.calls:
+			self.calls[kind] = 0
+
+
+class FakeRole:
+	def __init__(self, guild, name, permissions, role_id=None):
+		self.id = role_id or next(_ids)
+		self.guild = guild
+		self.name = name
+		self.permissions = permissions
+
+	def is_default(self):
+		return self.id == self.guild.id
+
+	def __eq__(self, other):
+		return isinstance(other, FakeRole) and other.id == self.id
+
+	def __hash__(self):
+		return hash(self.id)
+
+
+class FakeMessage:
+	def __init__(self, channel, message_id, embed):
+		self.channel = channel
+		self.id = message_id
+		self.embeds = [embed] if embed else []
+
+	async def edit(self, *, embed):
+		await self.channel.guild.rest.call('edit')
+		self.embeds = [embed]
+
+	async def delete(self):
+		await self.channel.guild.rest.call('delete')
+		self.channel.messages.pop(self.id, None)
+
+
+class FakePartialMessage:
+	def __init__(self, channel, message_id):
+		self.channel = channel
+		self.id = message_id
+
+	async def edit(self, *, embed):
+		await self.channel.guild.rest.call('edit')
+		if self.id not in self.channel.messages:
+			raise discord.NotFound(FakeResponse(404), 'Unknown Message')
+		self.channel.messages[self.id].embeds = [embed]
+
+	async def delete(self):
+		await self.channel.guild.rest.call('delete')
+		self.channel.messages.pop(self.id, None)
+
+
+class FakeChannel:
+	def __init__(self, guild, name, category=None, topic=None):
+		self.id = next(_ids)
+		self.guild = guild
+		self.name = name
+		self.category = category
+		self.topic = topic
+		self.position = 0
+		self.overwrites = {}
+		self.messages = {}
+
+	@property
+	def category_id(self):
+		return self.category.id if self.category else None
+
+	@property
+	def mention(self):
+		return f'<#{self.id}>'
+
+	def overwrites_for(self, role):
+		return self.overwrites.get(role, discord.PermissionOverwrite())
+
+	def get_partial_message(self, message_id):
+		return FakePartialMessage(self, message_id)
+
+	async def fetch_message(self, message_id):
+		await self.guild.rest.call('fetch')
+		if message_id not in self.messages:
+			raise discord.NotFound(FakeResponse(404), 'Unknown Message')
+		return self.messages[message_id]
+
+	async def send(self, *, embed):
+		await self.guild.rest.call('send')
+		msg = FakeMessage(self, next(_ids), embed)
+		self.messages[msg.id] = msg
+		return msg
+
+
+class FakeCategory(FakeChannel):
+	def __init__(self, guild, name):
+		super().__init__(guild, name)
+		del self.topic
+
+
+class FakeGuild:
+	"""A guild with `categories` categories, `channels` text channels spread between them and `roles` filter roles."""
+	def __init__(self, rest, *, categories, channels, roles, seed=0):
+		rng = random.Random(seed)
+		self.id = next(_ids)
+		self.unavailable = False
+		self.rest = rest
+		self.default_role = FakeRole(self, '@everyone', discord.Permissions(read_messages=True), role_id=self.id)
+		self.roles = [self.default_role] + [
+			FakeRole(self, f'role-{i}', discord.Permissions.none()) for i in range(roles)
+		]
+		self.categories = [FakeCategory(self, f'category-{i}') for i in range(categories)]
+		self.text_channels = []
+		for i in range(channels):
+			#about one in ten channels is not in a category
+			cat = rng.choice(self.categories) if self.categories and rng.random() > 0.1 else None
+			topic = ' '.join(rng.choice(('alpha', 'beta', 'gamma', 'delta', 'epsilon')) for _ in range(rng.randint(0, 12)))
+			self.text_channels.append(FakeChannel(self, f'channel-{i}', cat, topic))
+		for channel in self.categories + self.text_channels:
+			if rng.random() < 0.3:
+				channel.overwrites[self.default_role] = discord.PermissionOverwrite(read_messages=False)
+			for role in self.roles[1:]:
+				if rng.random() < 0.2:
+					channel.overwrites[role] = discord.PermissionOverwrite(read_messages=True)
+		self._by_id = {c.id: c for c in self.categories + self.text_channels}
+
+	@property
+	def channels(self):
+		return self.categories + self.text_channels
+
+	def get_channel(self, channel_id):
+		return self._by_id.get(channel_id)
+
+	def get_role(self, role_id):
+		for role in self.roles:
+			if role.id == role_id:
+				return role
+		return None
+
+	def by_category(self):
+		grouped = {None: []}
+		for cat in self.categories:
+			grouped[cat.id] = []
+		for channel in self.text_channels:
+			grouped[channel.category_id].append(channel)
+		result = [(None, grouped[None])]
+		result.extend((cat, grouped[cat.id]) for cat in self.categories)
+		return result
+
+
+class FakeBot:
+	def __init__(self, guilds):
+		self._guilds = {guild.id: guild for guild in guilds}
+		self._ready = asyncio.Event()
+
+	async def wait_until_red_ready(self):
+		#never becomes ready, so the load-time reconciliation only runs when a scenario asks for it
+		await self._ready.wait()
+
+	def get_guild(self, guild_id):
+		return self._guilds.get(guild_id)
+
+
+class FakeValue:
+	"""Stand-in for a Red config value, supporting the calls DynamicChannelList makes."""
+	def __init__(self, store, key, default, stats):
+		self._store = store
+		self._key = key
+		self._default = default
+		self._stats = stats
+
+	def __call__(self):
+		return self
+
+	async def _get(self):
+		self._stats['reads'] += 1
+		return copy.deepcopy(self._store.get(self._key, self._default))
+
+	def __await__(self):
+		return self._get().__await__()
+
+	async def set(self, value):
+		self._stats['writes'] += 1
+		self._store[self._key] = copy.deepcopy(value)
+
+	@contextlib.asynccontextmanager
+	async def _context(self):
+		value = await self._get()
+		yield value
+		await self.set(value)
+
+	async def __aenter__(self):
+		self._cm = self._context()
+		return await self._cm.__aenter__()
+
+	async def __aexit__(self, *exc):
+		return await self._cm.__aexit__(*exc)
+
+
+class FakeGroup:
+	def __init__(self, store, defaults, stats):
+		self._store = store
+		self._defaults = defaults
+		self._stats = stats
+
+	def __getattr__(self, name):
+		if name not in self._defaults:
+			raise AttributeError(name)
+		return FakeValue(self._store, name, self._defaults[name], self._stats)
+
+	async def all(self):
+		self._stats['reads'] += 1
+		data = copy.deepcopy(self._defaults)
+		data.update(copy.deepcopy(self._store))
+		return data
+
+
+class FakeConfig:
+	"""In-memory stand-in for Red's Config, counting reads and writes."""
+	def __init__(self):
+		self.stats = {'reads': 0, 'writes': 0}
+		self._guild_defaults = {}
+		self._global_defaults = {}
+		self._guilds = {}
+		self._global = {}
+
+	def register_guild(self, **defaults):
+		self._guild_defaults.update(defaults)
+
+	def register_global(self, **defaults):
+		self._global_defaults.update(defaults)
+
+	def guild_from_id(self, guild_id):
+		return FakeGroup(self._guilds.setdefault(guild_id, {}), self._guild_defaults, self.stats)
+
+	def guild(self, guild):
+		return self.guild_from_id(guild.id)
+
+	def __getattr__(self, name):
+		if name.startswith('_') or name not in self._global_defaults:
+			raise AttributeError(name)
+		return FakeValue(self._global, name, self._global_defaults[name], self.stats)
+
+	async def all_guilds(self):
+		self.stats['reads'] += 1
+		return {guild_id: await FakeGroup(data, self._guild_defaults, self.stats).all() for guild_id, data in self._guilds.items()}
+
+
+async def measure(name, results, coro_factory, *, rest, config, iterations=1):
+	"""Runs `coro_factory()` `iterations` times, recording time, allocations, API calls and config use."""
+	rest.reset()
+	reads, writes = config.stats['reads'], config.stats['writes']
+	tracemalloc.start()
+	start = time.perf_counter()
+	for _ in range(iterations):
+		await coro_factory()
+	elapsed = time.perf_counter() - start
+	current, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	results[name] = {
+		'iterations': iterations,
+		'seconds_total': elapsed,
+		'seconds_per_iteration': elapsed / iterations,
+		'peak_allocated_bytes': peak,
+		'api_calls': dict(rest.calls),
+		'config_reads': config.stats['reads'] - reads,
+		'config_writes': config.stats['writes'] - writes,
+	}
+	print(f'{name:<32} {elapsed / iterations * 1000:10.3f} ms/iter  api={sum(rest.calls.values())}')
+
+
+async def run(args):
+	rest = FakeREST(latency=args.latency)
+	guild = FakeGuild(rest, categories=args.categories, channels=args.channels, roles=args.roles, seed=args.seed)
+	config = FakeConfig()
+	with mock.patch.object(Config, 'get_conf', return_value=config):
+		cog = DynamicChannelList(FakeBot([guild]))
+
+	#create the auto lists the same way createauto stores them
+	list_channel = guild.text_channels[0]
+	toUpdate = []
+	for i in range(args.lists):
+		role = guild.roles[1 + i % args.roles] if args.roles and i % 2 else None
+		msg = await list_channel.send(embed=None)
+		toUpdate.append({
+			'channel_id': list_channel.id,
+			'message_ids': [msg.id],
+			'ignoreBlacklist': False,
+			'role_id': role.id if role else None,
+		})
+	await config.guild(guild).toUpdate.set(toUpdate)
+	await cog.cog_load()
+
+	def clear_render_caches():
+		cog._fragments.clear()
+		cog._visibility.clear()
+
+	async def build_cold():
+		clear_render_caches()
+		await cog.build_embed(guild)
+
+	async def build_cold_role():
+		clear_render_caches()
+		await cog.build_embed(guild, role=guild.roles[1])
+
+	async def build_warm():
+		await cog.build_embed(guild)
+
+	results = {}
+	try:
+		await measure('build_embed_cold', results, build_cold, rest=rest, config=config, iterations=args.iterations)
+		if args.roles:
+			await measure('build_embed_cold_role', results, build_cold_role, rest=rest, config=config, iterations=args.iterations)
+		await measure('build_embed_warm', results, build_warm, rest=rest, config=config, iterations=args.iterations)
+
+		embed_list = await cog.build_embed(guild, ignoreBlacklist=True)
+		chunks = [field.value for field in embed_list[0].fields] or [embed_list[0].description]
+		async def sub_build():
+			cog.sub_build_embed(chunks, discord.Color.red())
+		await measure('sub_build_embed', results, sub_build, rest=rest, config=config, iterations=args.iterations * 10)
+
+		#the first pass sends the extra pages and fetches every message, later passes use the cached state
+		await measure('run_update_first', results, lambda: cog.run_update(guild), rest=rest, config=config)
+		await measure('run_update_unchanged', results, lambda: cog.run_update(guild), rest=rest, config=config, iterations=args.iterations)
+
+		async def reconcile_unchanged():
+			async def pace(calls=1):
+				pass
+			await cog._reconcile_guild(guild, pace)
+		await measure('reconcile_unchanged', results, reconcile_unchanged, rest=rest, config=config)
+
+		#go through the listeners and scheduler like real events would, without waiting for the quiet period
+		cog._delays = (0.01, 0.1)
+		rng = random.Random(args.seed)
+		async def topic_change():
+			channel = rng.choice(guild.text_channels)
+			before = copy.copy(channel)
+			channel.topic = f'changed {rng.random()}'
+			await cog.on_guild_channel_update(before, channel)
+			await cog.schedule_update(guild, immediate=True)
+		await measure('run_update_topic_change', results, topic_change, rest=rest, config=config, iterations=args.iterations)
+
+		async def event_burst():
+			#a burst of events, like a template import, should result in one update
+			for channel in rng.sample(guild.text_channels, min(len(guild.text_channels), args.burst)):
+				before = copy.copy(channel)
+				channel.topic = f'burst {rng.random()}'
+				await cog.on_guild_channel_update(before, channel)
+			await cog.schedule_update(guild)
+		await measure('event_burst', results, event_burst, rest=rest, config=config)
+	finally:
+		cog.cog_unload()
+
+	return {
+		'parameters': vars(args),
+		'environment': {
+			'python': platform.python_version(),
+			'discord.py': discord.__version__,
+			'platform': platform.platform(),
+		},
+		'results': results,
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmark DynamicChannelList against a synthetic guild.')
+	parser.add_argument('--categories', type=int, default=50)
+	parser.add_argument('--channels', type=int, default=500)
+	parser.add_argument('--lists', type=int, default=100, help='Number of auto lists.')
+	parser.add_argument('--roles', type=int, default=20, help='Number of roles auto lists are filtered by.')
+	parser.add_argument('--iterations', type=int, default=20)
+	parser.add_argument('--burst', type=int, default=200, help='Number of events in the burst scenario.')
+	parser.add_argument('--latency', type=float, default=0, help='Simulated seconds per API call.')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--output', default='dynamicchannellist_bench.json', help='File to write the results to.')
+	args = parser.parse_args()
+	report = asyncio.run(run(args))
+	with open(args.output, 'w') as f:
+		json.dump(report, f, indent=4)
+	print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+	main()
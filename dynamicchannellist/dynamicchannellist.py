@@ -2,8 +2,149 @@ import discord
 from redbot.core import commands
 from redbot.core import Config
 from redbot.core import checks
-from redbot.core.utils.chat_formatting import pagify
+from redbot.core.utils.chat_formatting import escape, pagify
 from typing import Union, Optional
+import asyncio
+import collections
+import logging
+import time
+
+
+log = logging.getLogger('red.flamebountycogs.dynamicchannellist')
+
+
+class EditDispatcher:
+	"""
+	Sends channel list edits for every guild, with a limited number of edits in flight.
+	
+	Each channel has at most one edit in flight. A queued edit is replaced by a newer one
+	for the same message, and channels that hit a rate limit are backed off before retrying.
+	"""
+	def __init__(self, edit, concurrency):
+		#coroutine function taking (channel, message_id, embed)
+		self._edit = edit
+		self.concurrency = concurrency
+		#(channel id, message id) -> queued edit
+		self._pending = {}
+		self._order = collections.deque()
+		#channel ids with an edit in flight
+		self._busy = set()
+		#channel id -> (time edits can resume, number of rate limits in a row)
+		self._backoff = {}
+		self._wake = asyncio.Event()
+		self._workers = []
+	
+	def start(self):
+		"""Starts or stops workers until `concurrency` of them are running."""
+		while len(self._workers) > self.concurrency:
+			self._workers.pop().cancel()
+		while len(self._workers) < self.concurrency:
+			self._workers.append(asyncio.create_task(self._worker()))
+	
+	def stop(self):
+		"""Stops all workers and cancels every queued edit."""
+		for task in self._workers:
+			task.cancel()
+		self._workers = []
+		for job in self._pending.values():
+			for future in job['futures']:
+				future.cancel()
+		self._pending = {}
+		self._order.clear()
+	
+	def submit(self, channel, message_id, embed):
+		"""
+		Queue an edit of a message.
+		
+		Returns a future that finishes with the result of the edit that ends up being sent,
+		which may be a newer edit of the same message.
+		"""
+		key = (channel.id, message_id)
+		future = asyncio.get_running_loop().create_future()
+		job = self._pending.get(key)
+		if job is None:
+			job = {'channel': channel, 'embed': embed, 'futures': []}
+			self._pending[key] = job
+			self._order.append(key)
+		else:
+			job['channel'] = channel
+			job['embed'] = embed
+		job['futures'].append(future)
+		self._wake.set()
+		return future
+	
+	def _next_job(self):
+		"""Returns the next edit that can be sent, or when to check again if there is none."""
+		now = time.monotonic()
+		soonest = None
+		for key in self._order:
+			channel_id = key[0]
+			if channel_id in self._busy:
+				continue
+			resume = self._backoff.get(channel_id, (0, 0))[0]
+			if resume > now:
+				soonest = resume if soonest is None else min(soonest, resume)
+				continue
+			self._order.remove(key)
+			return key, self._pending.pop(key), None
+		return None, None, soonest
+	
+	async def _worker(self):
+		"""Sends queued edits until cancelled."""
+		while True:
+			key, job, soonest = self._next_job()
+			if job is None:
+				self._wake.clear()
+				timeout = None if soonest is None else soonest - time.monotonic()
+				try:
+					await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+				except asyncio.TimeoutError:
+					pass
+				continue
+			channel_id = key[0]
+			self._busy.add(channel_id)
+			try:
+				result = await self._edit(job['channel'], key[1], job['embed'])
+			except (discord.RateLimited, discord.HTTPException) as e:
+				if isinstance(e, discord.HTTPException) and e.status != 429:
+					self._finish(job, exception=e)
+					continue
+				failures = self._backoff.get(channel_id, (0, 0))[1] + 1
+				delay = max(getattr(e, 'retry_after', 0), min(2 ** failures, 60))
+				self._backoff[channel_id] = (time.monotonic() + delay, failures)
+				self._requeue(key, job)
+			except asyncio.CancelledError:
+				self._requeue(key, job)
+				raise
+			except Exception as e:
+				self._finish(job, exception=e)
+			else:
+				self._backoff.pop(channel_id, None)
+				self._finish(job, result=result)
+			finally:
+				self._busy.discard(channel_id)
+				self._wake.set()
+	
+	def _requeue(self, key, job):
+		"""Puts an edit that could not be sent back at the front of the queue."""
+		newer = self._pending.get(key)
+		if newer is not None:
+			#a newer edit was queued in the meantime, it replaces this one
+			newer['futures'].extend(job['futures'])
+			return
+		self._pending[key] = job
+		self._order.appendleft(key)
+	
+	@staticmethod
+	def _finish(job, *, result=None, exception=None):
+		"""Finishes the futures waiting on an edit."""
+		for future in job['futures']:
+			if future.done():
+				continue
+			if exception is not None:
+				future.set_exception(exception)
+			else:
+				future.set_result(result)
 
 
 class DynamicChannelList(commands.Cog):
@@ -18,6 +159,47 @@ class DynamicChannelList(commands.Cog):
 			color = 15158332,
 			toUpdate = []
 		)
+		self.config.register_global(
+			updateDelay = 2.0,
+			maxUpdateDelay = 10.0,
+			maxConcurrentEdits = 5,
+			reconcileRate = 2.0
+		)
+		self._delays = (2.0, 10.0)
+		self._reconcile_rate = 2.0
+		self._reconcile_task = None
+		#guild id -> pending refresh state, see schedule_update
+		self._refresh = {}
+		#(channel id, message id) -> fingerprint of the embed last shown in that message
+		self._rendered = {}
+		#guild id -> (role id, ignoreBlacklist) -> category id -> rendered text for that category
+		self._fragments = {}
+		#guild id -> cached guild settings and what the auto lists depend on, see _build_settings
+		self._settings = {}
+		#guild id -> role id -> ids of the channels that role can see
+		self._visibility = {}
+		self._dispatcher = EditDispatcher(self._edit_list, 5)
+	
+	async def cog_load(self):
+		self._delays = (await self.config.updateDelay(), await self.config.maxUpdateDelay())
+		self._dispatcher.concurrency = await self.config.maxConcurrentEdits()
+		self._dispatcher.start()
+		for guild_id, settings in (await self.config.all_guilds()).items():
+			#begin backwards compatibility
+			if any(isinstance(value, list) or 'message_id' in value for value in settings['toUpdate']):
+				settings['toUpdate'] = [self._normalize_entry(value) for value in settings['toUpdate']]
+				await self.config.guild_from_id(guild_id).toUpdate.set(settings['toUpdate'])
+			#end backwards compatibility
+			self._settings[guild_id] = self._build_settings(settings)
+		self._reconcile_rate = await self.config.reconcileRate()
+		self._reconcile_task = asyncio.create_task(self._reconcile_all())
+	
+	def cog_unload(self):
+		if self._reconcile_task is not None:
+			self._reconcile_task.cancel()
+		for state in self._refresh.values():
+			state['task'].cancel()
+		self._dispatcher.stop()
 	
 	@checks.mod_or_permissions(manage_channels=True)
 	@commands.bot_has_permissions(embed_links=True)
@@ -43,16 +225,21 @@ class DynamicChannelList(commands.Cog):
 		"""Create an automatically updating channel list."""
 		if not channel:
 			channel = ctx.channel
-		embed = await self.build_embed(ctx.guild, ignoreBlacklist=ignoreBlacklist, role=role)
-		embed = embed[0]
+		embed_list = await self.build_embed(ctx.guild, ignoreBlacklist=ignoreBlacklist, role=role)
+		message_ids = []
 		try:
-			msg = await channel.send(embed=embed)
+			for embed in embed_list:
+				msg = await channel.send(embed=embed)
+				message_ids.append(msg.id)
+				self._rendered[(channel.id, msg.id)] = self._fingerprint(embed)
 		except discord.errors.Forbidden:
-			await ctx.send('I cannot send messages to that channel.')
+			if not message_ids:
+				return await ctx.send('I cannot send messages to that channel.')
 		if role:
 			role = role.id
 		async with self.config.guild(ctx.guild).toUpdate() as toUpdate:
-			toUpdate.append({'channel_id': channel.id, 'message_id': msg.id, 'ignoreBlacklist': ignoreBlacklist, 'role_id': role})
+			toUpdate.append({'channel_id': channel.id, 'message_ids': message_ids, 'ignoreBlacklist': ignoreBlacklist, 'role_id': role})
+		await self._reload_settings(ctx.guild)
 	
 	@dynamicchannellist.command()
 	async def removeauto(self, ctx, message: discord.Message):
@@ -62,26 +249,33 @@ class DynamicChannelList(commands.Cog):
 		This will not delete the message, only stop it from updating.
 		`message` should be a link to the message.
 		"""
-		value = [message.channel.id, message.id]
+		found = False
 		async with self.config.guild(ctx.guild).toUpdate() as toUpdate:
 			for value in toUpdate:
-				if value['message_id'] == message.id:
+				message_ids = value['message_ids']
+				if message.id in message_ids:
 					toUpdate.remove(value)
-					await ctx.send('Done.')
-					return
-		await ctx.send('That message is not a dynamic channel list.')
+					found = True
+					break
+		if not found:
+			return await ctx.send('That message is not a dynamic channel list.')
+		for message_id in message_ids:
+			self._rendered.pop((message.channel.id, message_id), None)
+		await self._reload_settings(ctx.guild)
+		await ctx.send('Done.')
 	
 	@dynamicchannellist.command()
 	async def reloadauto(self, ctx):
 		"""Reload all automatically updating channel lists."""
-		await self.run_update(ctx.guild)
+		await self.schedule_update(ctx.guild, immediate=True)
 		await ctx.send('Done.')
 	
 	@dynamicchannellist.command()
 	async def color(self, ctx, color: discord.Color):
 		"""Set the color to use for embeds."""
 		await self.config.guild(ctx.guild).color.set(color.value)
-		await self.run_update(ctx.guild)
+		await self._reload_settings(ctx.guild)
+		await self.schedule_update(ctx.guild, immediate=True)
 		await ctx.send('Color set.')
 	
 	@dynamicchannellist.command()
@@ -90,9 +284,67 @@ class DynamicChannelList(commands.Cog):
 		if text is None:
 			text = ''
 		await self.config.guild(ctx.guild).header.set(text)
-		await self.run_update(ctx.guild)
+		await self._reload_settings(ctx.guild)
+		await self.schedule_update(ctx.guild, immediate=True)
 		await ctx.send('Header set.')
 	
+	@checks.is_owner()
+	@dynamicchannellist.command()
+	async def delay(self, ctx, quiet: float=None, maximum: float=None):
+		"""
+		Set how long to wait before updating channel lists after a change.
+		
+		Lists are updated once nothing has changed for `quiet` seconds,
+		but never later than `maximum` seconds after the first change.
+		If no values are provided, the current values will be shown.
+		"""
+		if quiet is None:
+			quiet, maximum = self._delays
+			return await ctx.send(f'Lists update after {quiet} quiet seconds, waiting at most {maximum} seconds.')
+		if maximum is None:
+			maximum = max(quiet, self._delays[1])
+		if quiet < 0 or maximum < quiet:
+			return await ctx.send('The delays must be positive, and `maximum` cannot be less than `quiet`.')
+		await self.config.updateDelay.set(quiet)
+		await self.config.maxUpdateDelay.set(maximum)
+		self._delays = (quiet, maximum)
+		await ctx.send(f'Lists will now update after {quiet} quiet seconds, waiting at most {maximum} seconds.')
+	
+	@checks.is_owner()
+	@dynamicchannellist.command()
+	async def concurrency(self, ctx, edits: int=None):
+		"""
+		Set how many channel list messages can be edited at the same time.
+		
+		This is shared between every server.
+		If no value is provided, the current value will be shown.
+		"""
+		if edits is None:
+			return await ctx.send(f'Up to {self._dispatcher.concurrency} messages are edited at the same time.')
+		if edits <= 0:
+			return await ctx.send('The number of edits must be greater than 0.')
+		await self.config.maxConcurrentEdits.set(edits)
+		self._dispatcher.concurrency = edits
+		self._dispatcher.start()
+		await ctx.send(f'Up to {edits} messages will now be edited at the same time.')
+	
+	@checks.is_owner()
+	@dynamicchannellist.command()
+	async def reconcilerate(self, ctx, rate: float=None):
+		"""
+		Set how many API calls per second can be used to check lists when the cog loads.
+		
+		When the cog loads, every stored list is checked in the background and brought up to date.
+		If no value is provided, the current value will be shown.
+		"""
+		if rate is None:
+			return await ctx.send(f'Lists are checked using up to {self._reconcile_rate} API calls per second.')
+		if rate <= 0:
+			return await ctx.send('The rate must be greater than 0.')
+		await self.config.reconcileRate.set(rate)
+		self._reconcile_rate = rate
+		await ctx.send(f'Lists will now be checked using up to {rate} API calls per second.')
+	
 	@dynamicchannellist.command(aliases=['categoryignore'])
 	async def categoryblacklist(self, ctx, cat: discord.CategoryChannel=None):
 		"""
@@ -112,7 +364,9 @@ class DynamicChannelList(commands.Cog):
 			else:
 				ignoredCategories.append(cat.id)
 				await ctx.send(f'Category {cat.name} is now blacklisted.')
-		await self.run_update(ctx.guild)
+		self._forget_categories(ctx.guild.id, (cat.id,))
+		await self._reload_settings(ctx.guild)
+		await self.schedule_update(ctx.guild, immediate=True)
 				
 	@dynamicchannellist.command(aliases=['channelignore'])
 	async def channelblacklist(self, ctx, chan: Union[discord.TextChannel, discord.VoiceChannel]=None):
@@ -133,131 +387,583 @@ class DynamicChannelList(commands.Cog):
 			else:
 				ignoredChannels.append(chan.id)
 				await ctx.send(f'Channel {chan.name} is now blacklisted.')
-		await self.run_update(ctx.guild)
+		self._forget_categories(ctx.guild.id, (chan.category_id,))
+		await self._reload_settings(ctx.guild)
+		await self.schedule_update(ctx.guild, immediate=True)
 	
 	@staticmethod
 	def can_see(role, channel):
-		"""Determines if a role can see a channel."""
-		#This code *might* fail based on implied perms (admin), not sure.
-		overwrite = channel.overwrites_for(role).read_messages
+		"""
+		Determines if a role can see a channel.
+		
+		This checks what a member with only this role (and @everyone) would see,
+		including the rights given by administrator and the overwrites for @everyone.
+		"""
+		everyone = role.guild.default_role
+		permissions = discord.Permissions(everyone.permissions.value | role.permissions.value)
+		if permissions.administrator:
+			return True
+		allowed = permissions.read_messages
+		overwrite = channel.overwrites_for(everyone).read_messages
 		if overwrite is not None:
-			return overwrite
-		return role.permissions.read_messages
+			allowed = overwrite
+		if role != everyone:
+			overwrite = channel.overwrites_for(role).read_messages
+			if overwrite is not None:
+				allowed = overwrite
+		return allowed
+	
+	def _visible_channels(self, guild, role):
+		"""
+		Returns the ids of the channels and categories a role can see.
+		
+		These are computed for every channel of the guild at once, and cached until
+		an overwrite or a permission of a role changes.
+		"""
+		cache = self._visibility.setdefault(guild.id, {})
+		visible = cache.get(role.id)
+		if visible is None:
+			visible = {channel.id for channel in guild.channels if self.can_see(role, channel)}
+			cache[role.id] = visible
+		return visible
+	
+	def _update_visibility(self, channel, *, deleted=False):
+		"""Updates the cached visibility of one channel for every cached role."""
+		cache = self._visibility.get(channel.guild.id, {})
+		for role_id, visible in list(cache.items()):
+			role = channel.guild.get_role(role_id)
+			if role is None:
+				del cache[role_id]
+			elif not deleted and self.can_see(role, channel):
+				visible.add(channel.id)
+			else:
+				visible.discard(channel.id)
 	
 	async def build_embed(self, guild, *, ignoreBlacklist=False, role=None):
 		"""Builds a list of embeds with the current settings."""
-		msg = ''
-		ignoredCategories = await self.config.guild(guild).ignoredCategories()
-		ignoredChannels = await self.config.guild(guild).ignoredChannels()
-		header = await self.config.guild(guild).header()
-		color = await self.config.guild(guild).color()
-		color = discord.Color(color)
+		settings = await self._get_settings(guild)
+		return self._render(guild, settings, ignoreBlacklist=ignoreBlacklist, role=role)
+	
+	def _render(self, guild, settings, *, ignoreBlacklist=False, role=None):
+		"""Builds a list of embeds using already loaded guild settings."""
+		ignoredCategories = settings['ignoredCategories']
+		ignoredChannels = settings['ignoredChannels']
+		header = settings['header']
+		color = discord.Color(settings['color'])
+		variant = (role.id if role else None, ignoreBlacklist)
+		visible = self._visible_channels(guild, role) if role else None
+		fragments = self._fragments.setdefault(guild.id, {}).setdefault(variant, {})
+		parts = [escape(f'{header}\n\n', mass_mentions=True)] if header else []
 		for cat, channels in guild.by_category():
-			if cat and cat.id in ignoredCategories and not ignoreBlacklist:
+			cat_id = cat.id if cat else None
+			fragment = fragments.get(cat_id)
+			if fragment is None:
+				fragment = self._render_category(
+					cat, channels, ignoredCategories, ignoredChannels, ignoreBlacklist, visible
+				)
+				fragments[cat_id] = fragment
+			if fragment:
+				parts.append(fragment)
+		first = 1 if header else 0
+		if len(parts) > first:
+			parts[first] = parts[first].lstrip()
+			parts[-1] = parts[-1].rstrip()
+		#chunks only break between categories unless one category does not fit in a chunk on its own,
+		#so a change to one category only changes the chunks holding it unless the category moves to the next chunk
+		chunks = []
+		for part in parts:
+			if len(part) > 1024:
+				chunks.extend(pagify(part, escape_mass_mentions=False, shorten_by=0, page_length=1024))
+				#the next category starts a new chunk, not the end of this one
+				chunks.append('')
+			elif chunks and len(chunks[-1]) + len(part) <= 1024:
+				chunks[-1] += part
+			else:
+				chunks.append(part)
+		chunks = [chunk for chunk in chunks if chunk]
+		#group the chunks in to embeds
+		embeds = []
+		page = []
+		length = 0
+		for chunk in chunks:
+			#chunks after the first two become fields, whose name also counts towards the limit
+			cost = len(chunk) + (1 if len(page) >= 2 else 0)
+			if page and (length + cost > 6000 or len(page) == 27):
+				embeds.append(self.sub_build_embed(page, color))
+				page = []
+				length = 0
+				cost = len(chunk)
+			page.append(chunk)
+			length += cost
+		if page or not embeds:
+			embeds.append(self.sub_build_embed(page or ['\u200B'], color))
+		return embeds
+	
+	@staticmethod
+	def _render_category(cat, channels, ignoredCategories, ignoredChannels, ignoreBlacklist, visible):
+		"""
+		Renders the part of a channel list that shows one category.
+		
+		`visible` is the set of channel ids the list's role can see, or None if it has no role.
+		"""
+		if cat and cat.id in ignoredCategories and not ignoreBlacklist:
+			return ''
+		if cat and visible is not None and cat.id not in visible:
+			return ''
+		lines = []
+		if cat:
+			lines.append(f'\n**{cat.name.upper()}**')
+		for chan in channels:
+			if chan.id in ignoredChannels and not ignoreBlacklist:
 				continue
-			if cat and role and not self.can_see(role, cat):
+			if visible is not None and chan.id not in visible:
 				continue
-			if cat:
-				msg += f'\n**{cat.name.upper()}**\n'
-			for chan in channels:
-				if chan.id in ignoredChannels and not ignoreBlacklist:
-					continue
-				if role and not self.can_see(role, chan):
-					continue
-				msg += f'{chan.mention}'
-				if hasattr(chan, 'topic'):
-					msg += f' - {chan.topic}'
-				msg += '\n'
-		msg = msg.strip()
-		if header:
-			msg = f'{header}\n\n{msg}'
-		#split in to chunks
-		split = list(pagify(msg, shorten_by=0, page_length=6000))
-		return [self.sub_build_embed(m, color) for m in split]
+			if hasattr(chan, 'topic'):
+				lines.append(f'{chan.mention} - {chan.topic}')
+			else:
+				lines.append(chan.mention)
+		if not lines:
+			return ''
+		return escape('\n'.join(lines) + '\n', mass_mentions=True)
 	
 	@staticmethod
-	def sub_build_embed(msg, color):
+	def sub_build_embed(chunks, color):
 		"""Makes the actual embed objects"""
-		split = list(pagify(msg, shorten_by=0, page_length=1024))
-		desc = split[0]
-		if len(split) > 1:
-			desc += split[1]
 		embed = discord.Embed(
-			description=desc,
+			description=''.join(chunks[:2]),
 			color=color
 		)
-		if len(split) > 2:
-			for x in split[2:]:
-				embed.add_field(name='\u200B', value=x, inline=False)
+		for x in chunks[2:]:
+			embed.add_field(name='\u200B', value=x, inline=False)
 		return embed
 	
+	def _forget_categories(self, guild_id, category_ids):
+		"""Drops the cached renders of some categories, so they are rendered again next update."""
+		for fragments in self._fragments.get(guild_id, {}).values():
+			for cat_id in category_ids:
+				fragments.pop(cat_id, None)
+	
+	def _forget_role(self, guild_id, role_id):
+		"""Drops the cached renders of lists filtered by a role."""
+		variants = self._fragments.get(guild_id, {})
+		for variant in [v for v in variants if v[0] == role_id]:
+			del variants[variant]
+	
 	@commands.Cog.listener()
 	async def on_guild_channel_create(self, channel):
-		await self.run_update(channel.guild)
+		self._forget_categories(channel.guild.id, (channel.category_id, channel.id))
+		self._update_visibility(channel)
+		if self._shown_anywhere(channel):
+			self.schedule_update(channel.guild)
 	
 	@commands.Cog.listener()
 	async def on_guild_channel_delete(self, channel):
-		await self.run_update(channel.guild)
+		#channels in a deleted category become uncategorized
+		self._forget_categories(channel.guild.id, (channel.category_id, channel.id, None))
+		self._update_visibility(channel, deleted=True)
+		settings = self._settings.get(channel.guild.id)
+		if settings is not None:
+			for value in settings['channels'].get(channel.id, []):
+				for message_id in value['message_ids']:
+					self._rendered.pop((channel.id, message_id), None)
+		if self._shown_anywhere(channel):
+			self.schedule_update(channel.guild)
 	
 	@commands.Cog.listener()
 	async def on_guild_channel_update(self, before, after):
-		await self.run_update(after.guild)
-	
-	@commands.Cog.listener()
-	async def on_guild_role_create(self, role):
-		await self.run_update(role.guild)
+		changed = self._changed_channel_fields(before, after)
+		if not changed:
+			return
+		self._forget_categories(after.guild.id, (before.category_id, after.category_id, after.id))
+		if 'overwrites' in changed:
+			self._update_visibility(after)
+		settings = self._settings.get(after.guild.id)
+		if settings is None:
+			return
+		if changed == {'overwrites'} and not settings['roles']:
+			#overwrites only matter to lists filtered by a role
+			return
+		if self._shown_anywhere(before) or self._shown_anywhere(after):
+			self.schedule_update(after.guild)
 	
 	@commands.Cog.listener()
 	async def on_guild_role_delete(self, role):
-		await self.run_update(role.guild)
+		self._forget_role(role.guild.id, role.id)
+		self._visibility.get(role.guild.id, {}).pop(role.id, None)
+		settings = self._settings.get(role.guild.id)
+		if settings is not None and role.id in settings['roles']:
+			self.schedule_update(role.guild)
 	
 	@commands.Cog.listener()
 	async def on_guild_role_update(self, before, after):
-		await self.run_update(after.guild)
+		if (
+			before.permissions.read_messages == after.permissions.read_messages
+			and before.permissions.administrator == after.permissions.administrator
+		):
+			return
+		settings = self._settings.get(after.guild.id)
+		if after.is_default():
+			#@everyone changes what every role can see
+			self._visibility.pop(after.guild.id, None)
+			variants = self._fragments.get(after.guild.id, {})
+			for variant in [v for v in variants if v[0] is not None]:
+				del variants[variant]
+			if settings is not None and settings['roles']:
+				self.schedule_update(after.guild)
+			return
+		self._forget_role(after.guild.id, after.id)
+		self._visibility.get(after.guild.id, {}).pop(after.id, None)
+		if settings is not None and after.id in settings['roles']:
+			self.schedule_update(after.guild)
 	
-	async def run_update(self, guild):
-		"""Update existing channel lists."""
-		main_embed = await self.build_embed(guild)
-		main_embed = main_embed[0]
-		async with self.config.guild(guild).toUpdate() as toUpdate:
-			#begin backwards compatibility
-			toRem = []
-			toAdd = []
-			for value in toUpdate:
-				if isinstance(value, list):
-					toRem.append(value)
-					value = {
-						'channel_id': value[0],
-						'message_id': value[1],
-						'role_id': value[2] if len(value) == 3 else None,
-						'ignoreBlacklist': False
-					}
-					toAdd.append(value)
-			if toRem or toAdd:
-				for x in toRem:
-					toUpdate.remove(x)
-				for x in toAdd:
-					toUpdate.append(x)
-			#end backwards compatibility
-			for value in toUpdate:
-				if value['role_id']:
-					role = guild.get_role(value['role_id'])
-					if not role:
-						continue
-					embed = await self.build_embed(guild, ignoreBlacklist=value['ignoreBlacklist'], role=role)
-					embed = embed[0]
-				else:
-					embed = main_embed
+	@staticmethod
+	def _changed_channel_fields(before, after):
+		"""Returns the fields that changed on a channel which can affect how it is rendered."""
+		fields = ('name', 'topic', 'position', 'category_id', 'overwrites')
+		return {f for f in fields if getattr(before, f, None) != getattr(after, f, None)}
+	
+	def _shown_anywhere(self, channel):
+		"""Determines if a channel or category can appear on any of the auto lists in its guild."""
+		settings = self._settings.get(channel.guild.id)
+		if not settings or not settings['toUpdate']:
+			return False
+		cat = channel if isinstance(channel, discord.CategoryChannel) else channel.category
+		blacklisted = (
+			channel.id in settings['ignoredChannels']
+			or (cat is not None and cat.id in settings['ignoredCategories'])
+		)
+		for role_id, ignoreBlacklist in settings['variants']:
+			if blacklisted and not ignoreBlacklist:
+				continue
+			if role_id is None:
+				return True
+			role = channel.guild.get_role(role_id)
+			if role is None:
+				continue
+			if (cat is None or self.can_see(role, cat)) and self.can_see(role, channel):
+				return True
+		return False
+	
+	async def _get_settings(self, guild):
+		"""Returns the cached settings of a guild, loading them from config if needed."""
+		settings = self._settings.get(guild.id)
+		if settings is None:
+			settings = await self._reload_settings(guild)
+		return settings
+	
+	async def _reload_settings(self, guild):
+		"""Reloads the cached settings of a guild after they were changed."""
+		settings = self._build_settings(await self.config.guild(guild).all())
+		self._settings[guild.id] = settings
+		return settings
+	
+	@classmethod
+	def _build_settings(cls, settings):
+		"""
+		Builds the cached form of a guild's settings.
+		
+		Besides the settings themselves, this keeps a lookup of what the auto lists depend on,
+		which is used to drop events that cannot change anything these lists show.
+		"""
+		roles = {}
+		channels = {}
+		variants = set()
+		toUpdate = [cls._normalize_entry(value) for value in settings['toUpdate']]
+		for value in toUpdate:
+			if value['role_id']:
+				roles.setdefault(value['role_id'], []).append(value)
+			channels.setdefault(value['channel_id'], []).append(value)
+			variants.add((value['role_id'], value['ignoreBlacklist']))
+		return {
+			'header': settings['header'],
+			'color': settings['color'],
+			'ignoredCategories': set(settings['ignoredCategories']),
+			'ignoredChannels': set(settings['ignoredChannels']),
+			'toUpdate': toUpdate,
+			'roles': roles,
+			'channels': channels,
+			'variants': variants,
+		}
+	
+	@staticmethod
+	def _normalize_entry(value):
+		"""Converts an auto list entry stored in an older format to the current format."""
+		if isinstance(value, list):
+			return {
+				'channel_id': value[0],
+				'message_ids': [value[1]],
+				'role_id': value[2] if len(value) == 3 else None,
+				'ignoreBlacklist': False
+			}
+		if 'message_id' in value:
+			value = dict(value)
+			value['message_ids'] = [value.pop('message_id')]
+		return value
+	
+	def schedule_update(self, guild, *, immediate=False):
+		"""
+		Request an update of a guild's channel lists.
+		
+		Bursts of requests are merged in to one update, which runs once no new request has
+		come in for `updateDelay` seconds, or `maxUpdateDelay` seconds after the first request.
+		Only one update runs per guild at a time. Requests made while an update is running
+		are merged in to a single follow-up update.
+		Returns a future that finishes once an update covering this request has run.
+		"""
+		now = time.monotonic()
+		state = self._refresh.get(guild.id)
+		if state is None:
+			state = {'first': now, 'last': now, 'immediate': False, 'wake': asyncio.Event(), 'waiters': [], 'task': None}
+			self._refresh[guild.id] = state
+		elif not state['waiters']:
+			#first request since the last update started
+			state['first'] = now
+		state['last'] = now
+		if immediate:
+			state['immediate'] = True
+			state['wake'].set()
+		future = asyncio.get_running_loop().create_future()
+		state['waiters'].append(future)
+		if state['task'] is None:
+			state['task'] = asyncio.create_task(self._refresh_loop(guild.id, state))
+		return future
+	
+	async def _refresh_loop(self, guild_id, state):
+		"""Runs pending updates for a guild until no more are requested."""
+		waiters = []
+		try:
+			while state['waiters']:
+				while not state['immediate']:
+					quiet, maximum = self._delays
+					remaining = min(state['last'] + quiet, state['first'] + maximum) - time.monotonic()
+					if remaining <= 0:
+						break
+					try:
+						await asyncio.wait_for(state['wake'].wait(), timeout=remaining)
+					except asyncio.TimeoutError:
+						pass
+				state['wake'].clear()
+				state['immediate'] = False
+				waiters, state['waiters'] = state['waiters'], []
+				guild = self.bot.get_guild(guild_id)
+				if guild is not None:
+					try:
+						await self.run_update(guild)
+					except Exception:
+						log.exception('Error while updating channel lists in guild %s', guild_id)
+				for future in waiters:
+					if not future.done():
+						future.set_result(None)
+		finally:
+			for future in waiters + state['waiters']:
+				if not future.done():
+					future.cancel()
+			del self._refresh[guild_id]
+	
+	async def _reconcile_all(self):
+		"""
+		Brings every stored list up to date after the cog loads.
+		
+		Lists whose channel or messages no longer exist are removed, and the settings and render
+		caches are warmed along the way. API calls are paced to stay under `reconcileRate` per second.
+		"""
+		await self.bot.wait_until_red_ready()
+		next_call = time.monotonic()
+		async def pace(calls=1):
+			nonlocal next_call
+			now = time.monotonic()
+			if next_call > now:
+				await asyncio.sleep(next_call - now)
+			next_call = max(now, next_call) + calls / self._reconcile_rate
+		for guild_id in list(self._settings):
+			guild = self.bot.get_guild(guild_id)
+			if guild is None or guild.unavailable:
+				continue
+			try:
+				await self._reconcile_guild(guild, pace)
+			except Exception:
+				log.exception('Error while checking channel lists in guild %s', guild_id)
+	
+	async def _reconcile_guild(self, guild, pace):
+		"""Checks the stored lists of one guild against their messages, see _reconcile_all."""
+		settings = await self._get_settings(guild)
+		if not settings['toUpdate']:
+			return
+		renders = {}
+		stale = False
+		#(channel id, message ids) -> message ids that still exist, or None if the list is gone
+		found = {}
+		for value in settings['toUpdate']:
+			key = (value['channel_id'], tuple(value['message_ids']))
+			channel = guild.get_channel(value['channel_id'])
+			if channel is None:
+				found[key] = None
+				continue
+			role = None
+			if value['role_id']:
+				role = guild.get_role(value['role_id'])
+				if role is None:
+					continue
+			variant = (value['role_id'], value['ignoreBlacklist'])
+			if variant not in renders:
+				renders[variant] = self._render(guild, settings, ignoreBlacklist=value['ignoreBlacklist'], role=role)
+			embed_list = renders[variant]
+			existing = []
+			for message_id in value['message_ids']:
+				await pace()
 				try:
-					msg = await guild.get_channel(value['channel_id']).fetch_message(value['message_id'])
-				except Exception:
+					msg = await channel.fetch_message(message_id)
+				except discord.NotFound:
 					continue
-				if (
-					msg.embeds[0].description != embed.description
-					or msg.embeds[0].color != embed.color
-					or msg.embeds[0].fields != embed.fields
-				):
-					try:
-						await msg.edit(embed=embed)
-					except discord.errors.Forbidden:
+				except discord.HTTPException:
+					existing.append(message_id)
+					continue
+				existing.append(message_id)
+				if msg.embeds:
+					self._rendered[(channel.id, message_id)] = self._fingerprint(msg.embeds[0])
+			if not existing:
+				found[key] = None
+				continue
+			if len(existing) != len(value['message_ids']):
+				found[key] = existing
+			#budget for the edits, sends and deletes the update will make
+			changes = abs(len(embed_list) - len(existing)) + sum(
+				self._rendered.get((channel.id, message_id)) != self._fingerprint(embed)
+				for message_id, embed in zip(existing, embed_list)
+			)
+			if changes:
+				stale = True
+				await pace(changes)
+		if found:
+			async with self.config.guild(guild).toUpdate() as toUpdate:
+				for value in list(toUpdate):
+					key = (value['channel_id'], tuple(value['message_ids']))
+					if key not in found:
 						continue
+					if found[key] is None:
+						toUpdate.remove(value)
+						for message_id in value['message_ids']:
+							self._rendered.pop((value['channel_id'], message_id), None)
+					else:
+						value['message_ids'] = found[key]
+			await self._reload_settings(guild)
+		if stale:
+			await self.schedule_update(guild, immediate=True)
+	
+	async def run_update(self, guild):
+		"""Update existing channel lists."""
+		settings = await self._get_settings(guild)
+		lists = [dict(value, message_ids=list(value['message_ids'])) for value in settings['toUpdate']]
+		#group lists that show the same thing, so each variant is only rendered once
+		plan = {}
+		for value in lists:
+			plan.setdefault((value['role_id'], value['ignoreBlacklist']), []).append(value)
+		edits = []
+		moved = {}
+		for (role_id, ignoreBlacklist), values in plan.items():
+			role = None
+			if role_id:
+				role = guild.get_role(role_id)
+				if not role:
+					continue
+			embed_list = self._render(guild, settings, ignoreBlacklist=ignoreBlacklist, role=role)
+			for value in values:
+				channel = guild.get_channel(value['channel_id'])
+				if channel is None:
+					continue
+				old_ids = tuple(value['message_ids'])
+				edits.extend(await self._update_list(channel, value, embed_list))
+				if tuple(value['message_ids']) != old_ids:
+					moved[(value['channel_id'], old_ids)] = value['message_ids']
+		if moved:
+			async with self.config.guild(guild).toUpdate() as toUpdate:
+				for value in toUpdate:
+					key = (value['channel_id'], tuple(value['message_ids']))
+					if key in moved:
+						value['message_ids'] = moved[key]
+			await self._reload_settings(guild)
+		await asyncio.gather(*edits, return_exceptions=True)
+	
+	async def _update_list(self, channel, value, embed_list):
+		"""
+		Make an auto list show a list of embeds, one message per embed.
+		
+		Edits are handed to the dispatcher, so only pages whose content changed are edited.
+		Messages are sent or deleted right away when the number of pages changes,
+		updating `value['message_ids']` in place.
+		Returns the futures of the queued edits.
+		"""
+		message_ids = value['message_ids']
+		edits = [
+			self._dispatcher.submit(channel, message_id, embed)
+			for message_id, embed in zip(message_ids, embed_list)
+		]
+		if len(embed_list) > len(message_ids):
+			for embed in embed_list[len(message_ids):]:
+				try:
+					msg = await channel.send(embed=embed)
+				except discord.HTTPException:
+					break
+				message_ids.append(msg.id)
+				self._rendered[(channel.id, msg.id)] = self._fingerprint(embed)
+		elif len(embed_list) < len(message_ids):
+			for message_id in message_ids[len(embed_list):]:
+				try:
+					await channel.get_partial_message(message_id).delete()
+				except discord.NotFound:
+					pass
+				except discord.HTTPException:
+					#keep track of it so deleting it can be retried later
+					break
+				message_ids.remove(message_id)
+				self._rendered.pop((channel.id, message_id), None)
+		return edits
+	
+	async def _edit_list(self, channel, message_id, embed):
+		"""
+		Make a channel list message show `embed`.
+		
+		Messages whose last rendered state is known are edited without fetching them first,
+		and skipped entirely if nothing changed.
+		Returns True if the message is now up to date. Rate limits are raised for the dispatcher.
+		"""
+		key = (channel.id, message_id)
+		fingerprint = self._fingerprint(embed)
+		cached = self._rendered.get(key)
+		if cached == fingerprint:
+			return True
+		if cached is not None:
+			try:
+				await channel.get_partial_message(message_id).edit(embed=embed)
+			except discord.HTTPException as e:
+				if e.status == 429:
+					raise
+			else:
+				self._rendered[key] = fingerprint
+				return True
+		#the cached state is missing or stale, check the actual message
+		self._rendered.pop(key, None)
+		try:
+			msg = await channel.fetch_message(message_id)
+		except discord.HTTPException as e:
+			if e.status == 429:
+				raise
+			return False
+		if not msg.embeds or self._fingerprint(msg.embeds[0]) != fingerprint:
+			try:
+				await msg.edit(embed=embed)
+			except discord.HTTPException as e:
+				if e.status == 429:
+					raise
+				return False
+		self._rendered[key] = fingerprint
+		return True
+	
+	@staticmethod
+	def _fingerprint(embed):
+		"""Hashes the parts of an embed that a channel list uses."""
+		return hash((
+			embed.description,
+			embed.color.value if embed.color else None,
+			tuple((field.name, field.value) for field in embed.fields)
+		))
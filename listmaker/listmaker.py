@@ -3,7 +3,246 @@ from redbot.core import commands
 from redbot.core import Config
 from redbot.core.utils.chat_formatting import pagify
 from tabulate import tabulate
+import aiohttp
+import asyncio
+import bisect
+import codecs
+import collections
+import csv
 import datetime
+import io
+import json
+import math
+import shlex
+import tempfile
+
+
+#total characters of the tables kept by the show cache
+RENDER_CACHE_CHARS = 4000000
+#seconds changes to a list are kept in memory before being written to config together
+FLUSH_DELAY = 5.0
+#characters of a page of a table, leaving room under the message limit for the page counter
+PAGE_CHARS = 1900
+
+
+class Table:
+	"""
+	A list prepared to be formatted one page at a time.
+	
+	Column widths and alignment are computed once for the whole list, so every page lines up
+	with the others while only the rows of the page being shown are formatted.
+	"""
+	def __init__(self, header, columns, rows, index=None):
+		self.header = header[:PAGE_CHARS // 2]
+		self.rows = rows
+		self.index = index
+		widths = [len(column) for column in columns]
+		numeric = [bool(rows)] * len(columns)
+		for row in rows:
+			for i, value in enumerate(row):
+				if len(value) > widths[i]:
+					widths[i] = len(value)
+				if numeric[i] and not self._is_number(value):
+					numeric[i] = False
+		columns = list(columns)
+		if index is not None:
+			widths.insert(0, max((len(str(i)) for i in index), default=1))
+			numeric.insert(0, True)
+			columns.insert(0, '')
+		self.widths = widths
+		self.numeric = numeric
+		self.line_length = sum(widths) + 2 * (len(widths) - 1)
+		self.head = self._line(columns) + '\n' + self._line(['-' * w for w in widths])
+		fixed = len(self.header) + len(self.head) + len('```\n\n\n```')
+		self.rows_per_page = max(1, (PAGE_CHARS - fixed) // (self.line_length + 1))
+		self.page_count = max(1, -(-len(rows) // self.rows_per_page))
+		self.size = len(rows) * (self.line_length + 1)
+	
+	@staticmethod
+	def _is_number(value):
+		try:
+			float(value.replace(',', ''))
+		except ValueError:
+			return False
+		return True
+	
+	def _line(self, cells):
+		line = '  '.join(
+			cell.rjust(width) if numeric else cell.ljust(width)
+			for cell, width, numeric in zip(cells, self.widths, self.numeric)
+		)
+		return line.rstrip()
+	
+	def format_page(self, page):
+		"""Formats the rows of a single page, counting from 0."""
+		start = page * self.rows_per_page
+		lines = []
+		for i in range(start, min(start + self.rows_per_page, len(self.rows))):
+			row = self.rows[i]
+			if self.index is not None:
+				row = [str(self.index[i])] + row
+			lines.append(self._line(row))
+		body = '\n'.join((self.header, self.head, *lines))
+		if len(body) > PAGE_CHARS:
+			#a single row wider than a message
+			body = body[:PAGE_CHARS - 3] + '...'
+		msg = f'```\n{body}```'
+		if self.page_count > 1:
+			msg += f'Page {page + 1}/{self.page_count}'
+		return msg
+
+
+class ColumnIndex:
+	"""
+	Hash and sorted indexes of the values in one column of a list.
+	
+	`rows` maps each value to the indexes of the rows holding it.
+	`prefixes` holds the distinct values in text order for prefix searches,
+	`ordered` holds them in the order of `key` (with their keys in `keys`) for range searches.
+	"""
+	def __init__(self, data, column, key):
+		self.column = column
+		self.key = key
+		self.rows = {}
+		self.add(data, 0)
+	
+	def add(self, data, start):
+		"""Indexes the rows of `data` from `start` onwards."""
+		new = []
+		for i in range(start, len(data)):
+			value = data[i][self.column]
+			if value in self.rows:
+				self.rows[value].append(i)
+			else:
+				self.rows[value] = [i]
+				new.append(value)
+		if start == 0 or len(new) > len(self.rows) // 4:
+			self.prefixes = sorted(self.rows)
+			self.ordered = sorted(self.rows, key=self.key)
+			self.keys = [self.key(value) for value in self.ordered]
+			return
+		for value in new:
+			bisect.insort(self.prefixes, value)
+			key = self.key(value)
+			pos = bisect.bisect_right(self.keys, key)
+			self.keys.insert(pos, key)
+			self.ordered.insert(pos, value)
+	
+	def remove(self, row, row_index):
+		"""Removes the deleted row `row`, which was at `row_index`, shifting the rows after it."""
+		value = row[self.column]
+		rows = self.rows[value]
+		rows.remove(row_index)
+		if not rows:
+			del self.rows[value]
+			del self.prefixes[bisect.bisect_left(self.prefixes, value)]
+			pos = bisect.bisect_left(self.keys, self.key(value))
+			while self.ordered[pos] != value:
+				pos += 1
+			del self.keys[pos]
+			del self.ordered[pos]
+		for rows in self.rows.values():
+			for i, index in enumerate(rows):
+				if index > row_index:
+					rows[i] = index - 1
+	
+	def find(self, value):
+		return list(self.rows.get(value, ()))
+	
+	def find_prefix(self, prefix):
+		start = bisect.bisect_left(self.prefixes, prefix)
+		end = bisect.bisect_left(self.prefixes, prefix + '\U0010ffff')
+		return self._collect(self.prefixes[start:end])
+	
+	def find_range(self, low, high):
+		start = bisect.bisect_left(self.keys, self.key(low))
+		end = bisect.bisect_right(self.keys, self.key(high))
+		return self._collect(self.ordered[start:end])
+	
+	def _collect(self, values):
+		found = []
+		for value in values:
+			found.extend(self.rows[value])
+		found.sort()
+		return found
+
+
+class JumpModal(discord.ui.Modal, title='Go to page'):
+	"""Asks for the page of a TableView to go to."""
+	page = discord.ui.TextInput(label='Page number', max_length=10)
+	
+	def __init__(self, menu):
+		super().__init__()
+		self.menu = menu
+	
+	async def on_submit(self, interaction):
+		try:
+			page = int(self.page.value)
+		except ValueError:
+			await interaction.response.send_message('That is not a page number.', ephemeral=True)
+			return
+		self.menu.page = min(max(page, 1), self.menu.table.page_count) - 1
+		await self.menu.show_page(interaction)
+
+
+class TableView(discord.ui.View):
+	"""Buttons to move through the pages of a Table, formatting each page when it is shown."""
+	def __init__(self, table, author, page=0):
+		super().__init__(timeout=180)
+		self.table = table
+		self.author = author
+		self.page = page
+		self.message = None
+	
+	async def interaction_check(self, interaction):
+		if interaction.user.id != self.author.id:
+			await interaction.response.send_message('You are not allowed to use this menu.', ephemeral=True)
+			return False
+		return True
+	
+	async def on_timeout(self):
+		if self.message is None:
+			return
+		try:
+			await self.message.edit(view=None)
+		except discord.HTTPException:
+			pass
+	
+	async def show_page(self, interaction):
+		await interaction.response.edit_message(content=self.table.format_page(self.page), view=self)
+	
+	@discord.ui.button(emoji='\N{BLACK LEFT-POINTING DOUBLE TRIANGLE WITH VERTICAL BAR}', style=discord.ButtonStyle.grey)
+	async def first(self, interaction, button):
+		self.page = 0
+		await self.show_page(interaction)
+	
+	@discord.ui.button(emoji='\N{LEFTWARDS BLACK ARROW}', style=discord.ButtonStyle.grey)
+	async def previous(self, interaction, button):
+		self.page = (self.page - 1) % self.table.page_count
+		await self.show_page(interaction)
+	
+	@discord.ui.button(label='Go to', style=discord.ButtonStyle.grey)
+	async def jump(self, interaction, button):
+		await interaction.response.send_modal(JumpModal(self))
+	
+	@discord.ui.button(emoji='\N{BLACK RIGHTWARDS ARROW}', style=discord.ButtonStyle.grey)
+	async def next(self, interaction, button):
+		self.page = (self.page + 1) % self.table.page_count
+		await self.show_page(interaction)
+	
+	@discord.ui.button(emoji='\N{BLACK RIGHT-POINTING DOUBLE TRIANGLE WITH VERTICAL BAR}', style=discord.ButtonStyle.grey)
+	async def last(self, interaction, button):
+		self.page = self.table.page_count - 1
+		await self.show_page(interaction)
+	
+	@discord.ui.button(emoji='\N{CROSS MARK}', style=discord.ButtonStyle.red)
+	async def close(self, interaction, button):
+		self.stop()
+		await interaction.response.defer()
+		try:
+			await interaction.message.delete()
+		except discord.HTTPException:
+			pass
 
 
 class ListMaker(commands.Cog):
@@ -12,8 +251,57 @@ class ListMaker(commands.Cog):
 		self.bot = bot
 		self.config = Config.get_conf(self, identifier=145519400223506432)
 		self.config.register_global(
+			#name -> author id of every list, the lists themselves are stored in the LIST custom group
+			index = {},
+			#old storage of every list, see cog_load
 			lists = {}
 		)
+		self.config.init_custom('LIST', 1)
+		self.config.register_custom('LIST',
+			author = None,
+			columns = [],
+			data = [],
+			#`data` stored as one array per column when not None, see _encode_columns
+			columnar = None,
+			roles = [],
+			sort = None,
+			#row indexes of `data` in sorted order, kept up to date while `sort` is set
+			order = None,
+			#column index -> how that column is sorted, see _sort_key
+			types = {},
+			header = '',
+			last_update = None
+		)
+		#list name -> in memory counter bumped every time the rendered form of the list may change
+		self._versions = {}
+		#(list name, version, show_index) -> Table, least recently used first
+		self._render_cache = collections.OrderedDict()
+		self._render_cache_chars = 0
+		#list name -> in memory copy of the list with its data as rows, see _get_list
+		self._lists = {}
+		#list name -> lock held while a list is changed or written to config
+		self._locks = collections.defaultdict(asyncio.Lock)
+		#names of lists with changes that have not been written to config yet
+		self._dirty = set()
+		self._flush_task = None
+		#list name -> column index -> ColumnIndex, built on the first search of that column
+		self._indexes = {}
+	
+	async def cog_load(self):
+		#begin backwards compatibility
+		lists = await self.config.lists()
+		if lists:
+			async with self.config.index() as index:
+				for list_name, lm_list in lists.items():
+					await self.config.custom('LIST', list_name).set(lm_list)
+					index[list_name] = lm_list['author']
+			await self.config.lists.clear()
+		#end backwards compatibility
+	
+	async def cog_unload(self):
+		if self._flush_task is not None:
+			self._flush_task.cancel()
+		await self._flush()
 		
 	@commands.group()
 	async def listmaker(self, ctx):
@@ -31,20 +319,24 @@ class ListMaker(commands.Cog):
 		Example:
 		`[p]listmaker create "My friends" name age`
 		"""
-		async with self.config.lists() as lists:
-			if list_name in lists:
+		async with self._locks[list_name]:
+			if list_name in await self.config.index():
 				await ctx.send('That list name is already taken.')
 				return
-			lists[list_name] = {
+			#written before the name is added to the index, which is what marks the list as existing
+			await self.config.custom('LIST', list_name).set({
 				'author': ctx.author.id,
 				'columns': column_names,
 				'data': [],
-				#BELOW ARE NOT GUARANTEED TO BE IN A LIST
 				'roles': [],
 				'sort': None,
 				'header': '',
 				'last_update': self._date_formatted()
-			}
+			})
+			self._lists.pop(list_name, None)
+			async with self.config.index() as index:
+				index[list_name] = ctx.author.id
+		self._changed(list_name)
 		await ctx.send(f'List `{list_name}` created.')
 		
 	@listmaker.command(require_var_positional=True)
@@ -59,21 +351,24 @@ class ListMaker(commands.Cog):
 		Example:
 		`[p]listmaker add "My friends" "Robert Smith" 26`
 		"""
-		async with self.config.lists() as lists:
-			if list_name not in lists:
-				await ctx.send('That list does not exist.')
-				return
-			if not self._user_can_access(lists[list_name], ctx.author):
-				await ctx.send('You do not have permission to edit that list.')
-				return
-			req_len = len(lists[list_name]['columns'])
-			if len(values) % req_len != 0:
-				await ctx.send('The number of columns provided does not match the number of columns in the list.')
-				return
-			while values:	
-				lists[list_name]['data'].append(values[:req_len])
+		lm = await self._get_editable(ctx, list_name)
+		if lm is None:
+			return
+		req_len = len(lm['columns'])
+		if len(values) % req_len != 0:
+			await ctx.send('The number of columns provided does not match the number of columns in the list.')
+			return
+		async with self._locks[list_name]:
+			start = len(lm['data'])
+			while values:
+				lm['data'].append(list(values[:req_len]))
 				values = values[req_len:]
-			lists[list_name]['last_update'] = self._date_formatted()
+			self._insert_order(lm, range(start, len(lm['data'])))
+			for index in self._indexes.get(list_name, {}).values():
+				index.add(lm['data'], start)
+			lm['last_update'] = self._date_formatted()
+			self._save_later(list_name)
+		self._changed(list_name)
 		await ctx.send('Data added.')
 	
 	@listmaker.command()
@@ -87,55 +382,486 @@ class ListMaker(commands.Cog):
 		Example:
 		`[p]listmaker remove "My friends" 3`
 		"""
-		async with self.config.lists() as lists:
-			if list_name not in lists:
-				await ctx.send('That list does not exist.')
-				return
-			if not self._user_can_access(lists[list_name], ctx.author):
-				await ctx.send('You do not have permission to edit that list.')
-				return
-			if row_number <= 0:
-				await ctx.send('The row number must be greater than 0.')
-				return
-			if row_number > len(lists[list_name]['data']):
+		lm = await self._get_editable(ctx, list_name)
+		if lm is None:
+			return
+		if row_number <= 0:
+			await ctx.send('The row number must be greater than 0.')
+			return
+		async with self._locks[list_name]:
+			if row_number > len(lm['data']):
 				await ctx.send('The row number cannot be greater than the number of rows.')
 				return
-			del lists[list_name]['data'][row_number - 1]
-			lists[list_name]['last_update'] = self._date_formatted()
+			row = lm['data'].pop(row_number - 1)
+			self._remove_order(lm, row_number - 1)
+			for index in self._indexes.get(list_name, {}).values():
+				index.remove(row, row_number - 1)
+			lm['last_update'] = self._date_formatted()
+			self._save_later(list_name)
+		self._changed(list_name)
 		await ctx.send('Data removed.')
 	
 	@listmaker.command()
-	async def show(self, ctx, list_name, show_index: bool=False):
+	async def batch(self, ctx, list_name, *, operations):
+		"""
+		Make many changes to a list at once.
+		
+		Put one operation per line after the list name:
+		`remove <rows>` removes rows, given as numbers or ranges like `3-10`.
+		`set <row> <column> <value>` changes a single value.
+		`add <values>` adds rows, like `[p]listmaker add`.
+		Row numbers always refer to the list as it was before the batch, so they do not shift.
+		Operations that fail are skipped and reported, the others are saved together.
+		Wrap anything that requires spaces in quotes.
+		
+		Example:
+		`[p]listmaker batch "My friends"
+		remove 3-10 15
+		set 4 age 27
+		add "Robert Smith" 26`
+		"""
+		lm = await self._get_editable(ctx, list_name)
+		if lm is None:
+			return
+		async with self._locks[list_name]:
+			report = self._apply_batch(list_name, lm, operations)
+		self._changed(list_name)
+		await ctx.send_interactive(pagify('\n'.join(report)))
+	
+	def _apply_batch(self, list_name, lm, operations):
+		"""Applies the operations of the batch command to a list, returning a line reporting the outcome of each."""
+		columns = lm['columns']
+		row_count = len(lm['data'])
+		removed = set()
+		edits = {}
+		added = []
+		report = []
+		for line in operations.strip('`\n').splitlines():
+			try:
+				parts = shlex.split(line)
+			except ValueError as e:
+				report.append(f'{line}: {e}')
+				continue
+			if not parts:
+				continue
+			action, args = parts[0].lower(), parts[1:]
+			if action == 'remove':
+				try:
+					rows = self._parse_rows(args, row_count)
+				except ValueError as e:
+					report.append(f'{line}: {e}')
+					continue
+				removed.update(rows)
+				report.append(f'{line}: removed {len(rows)} rows.')
+			elif action == 'set':
+				if len(args) != 3:
+					report.append(f'{line}: expected a row, a column and a value.')
+					continue
+				try:
+					row = self._parse_rows(args[:1], row_count)[0]
+				except ValueError as e:
+					report.append(f'{line}: {e}')
+					continue
+				if row in removed:
+					report.append(f'{line}: that row is removed by this batch.')
+					continue
+				if args[1] not in columns:
+					report.append(f'{line}: that column could not be found.')
+					continue
+				edits.setdefault(row, {})[columns.index(args[1])] = args[2]
+				report.append(f'{line}: updated.')
+			elif action == 'add':
+				if not args or len(args) % len(columns) != 0:
+					report.append(f'{line}: the number of values does not match the number of columns.')
+					continue
+				for i in range(0, len(args), len(columns)):
+					added.append(args[i:i + len(columns)])
+				report.append(f'{line}: added {len(args) // len(columns)} rows.')
+			else:
+				report.append(f'{line}: unknown operation, use `remove`, `set` or `add`.')
+		if not removed and not edits and not added:
+			report.append('Nothing was changed.')
+			return report
+		data = []
+		for i, row in enumerate(lm['data']):
+			if i in removed:
+				continue
+			if i in edits:
+				#a new row, the old one may still be shown by an open TableView
+				row = list(row)
+				for col, value in edits[i].items():
+					row[col] = value
+			data.append(row)
+		data.extend(added)
+		lm['data'] = data
+		self._build_order(lm)
+		self._indexes.pop(list_name, None)
+		lm['last_update'] = self._date_formatted()
+		self._save_later(list_name)
+		report.append(f'The list now has {len(data)} rows.')
+		return report
+	
+	@staticmethod
+	def _parse_rows(args, row_count):
+		"""Converts row numbers and ranges like `3-10` to a list of row indexes, raising ValueError if any are invalid."""
+		if not args:
+			raise ValueError('expected row numbers.')
+		rows = []
+		for arg in args:
+			first, _, last = arg.partition('-')
+			try:
+				first = int(first)
+				last = int(last) if last else first
+			except ValueError:
+				raise ValueError(f'`{arg}` is not a row number or range.')
+			if first <= 0 or last < first:
+				raise ValueError(f'`{arg}` is not a valid row range.')
+			if last > row_count:
+				raise ValueError(f'the list only has {row_count} rows.')
+			rows.extend(range(first - 1, last))
+		return rows
+	
+	@listmaker.command(name='import')
+	async def import_(self, ctx, list_name):
+		"""
+		Add rows of data to a list from an attached CSV or JSON file.
+		
+		CSV files should have one row per line. A first line matching the column names is skipped.
+		JSON files should hold an array of rows, or one row per line,
+		where each row is either an array of values or an object keyed by column name.
+		All of the rows are added at once, nothing is added if any row is invalid.
+		
+		Example:
+		`[p]listmaker import "My friends"` with `friends.csv` attached
+		"""
+		if not ctx.message.attachments:
+			await ctx.send('Attach a CSV or JSON file to import.')
+			return
+		attachment = ctx.message.attachments[0]
+		filename = attachment.filename.lower()
+		if filename.endswith('.csv'):
+			parser = self._parse_csv
+			stream = lambda resp: resp.content
+		elif filename.endswith(('.json', '.jsonl')):
+			parser = self._parse_json
+			stream = lambda resp: resp.content.iter_chunked(64 * 1024)
+		else:
+			await ctx.send('The attached file must be a `.csv` or `.json` file.')
+			return
+		lm = await self._get_editable(ctx, list_name)
+		if lm is None:
+			return
+		columns = lm['columns']
+		rows = []
+		try:
+			async with aiohttp.ClientSession() as session:
+				async with session.get(attachment.url) as resp:
+					resp.raise_for_status()
+					async for row in parser(self._iter_text(stream(resp)), columns):
+						rows.append(row)
+		except aiohttp.ClientError:
+			await ctx.send('I could not download that file.')
+			return
+		except ValueError as e:
+			await ctx.send(f'Nothing was imported. {e}')
+			return
+		if not rows:
+			await ctx.send('That file does not contain any rows.')
+			return
+		async with self._locks[list_name]:
+			lm['data'].extend(rows)
+			self._insert_order(lm, range(len(lm['data']) - len(rows), len(lm['data'])))
+			#rebuilt on the next find instead of inserting every row
+			self._indexes.pop(list_name, None)
+			lm['last_update'] = self._date_formatted()
+			self._save_later(list_name)
+		self._changed(list_name)
+		await ctx.send(f'Imported {len(rows)} rows.')
+	
+	@listmaker.command()
+	async def export(self, ctx, list_name, file_format='csv'):
+		"""
+		Receive the data of a list as a file.
+		
+		Use the parameter `file_format` to pick between `csv` and `json`.
+		
+		Example:
+		`[p]listmaker export "My friends" json`
+		"""
+		file_format = file_format.lower()
+		if file_format not in ('csv', 'json'):
+			await ctx.send('The file format must be `csv` or `json`.')
+			return
+		if list_name not in await self.config.index():
+			await ctx.send('That list does not exist.')
+			return
+		lm = await self._get_list(list_name)
+		columns, data = lm['columns'], lm['data']
+		#written to disk row by row, so only the loaded list is held in memory
+		with tempfile.TemporaryFile() as fp:
+			text = io.TextIOWrapper(fp, encoding='utf-8', newline='')
+			if file_format == 'csv':
+				writer = csv.writer(text)
+				writer.writerow(columns)
+				writer.writerows(data)
+			else:
+				text.write('[')
+				for idx, row in enumerate(data):
+					text.write(',\n' if idx else '\n')
+					text.write(json.dumps(dict(zip(columns, row))))
+				text.write('\n]\n')
+			text.flush()
+			text.detach()
+			limit = ctx.guild.filesize_limit if ctx.guild else 8 * 1024 * 1024
+			if fp.tell() > limit:
+				await ctx.send('That list is too large to upload.')
+				return
+			fp.seek(0)
+			await ctx.send(file=discord.File(fp, filename=f'{list_name}.{file_format}'))
+	
+	@staticmethod
+	async def _iter_text(content):
+		"""Decodes an async iterator of bytes in to an async iterator of text, one piece at a time."""
+		decoder = codecs.getincrementaldecoder('utf-8-sig')()
+		async for piece in content:
+			text = decoder.decode(piece)
+			if text:
+				yield text
+		text = decoder.decode(b'', final=True)
+		if text:
+			yield text
+	
+	@staticmethod
+	def _check_row(row, columns, row_number):
+		"""Converts a parsed row to a list of strings, raising ValueError if it does not fit `columns`."""
+		if isinstance(row, dict):
+			missing = [c for c in columns if c not in row]
+			if missing:
+				raise ValueError(f'Row {row_number} is missing the column `{missing[0]}`.')
+			row = [row[c] for c in columns]
+		elif not isinstance(row, list):
+			raise ValueError(f'Row {row_number} is not a list of values.')
+		if len(row) != len(columns):
+			raise ValueError(
+				f'Row {row_number} has {len(row)} values, but the list has {len(columns)} columns.'
+			)
+		return ['' if value is None else str(value) for value in row]
+	
+	@classmethod
+	async def _parse_csv(cls, lines, columns):
+		"""Yields the rows of a CSV file from an async iterator of its lines."""
+		record = ''
+		row_number = 0
+		async for line in lines:
+			record += line
+			#a record continues on the next line while it has an unclosed quote
+			if record.count('"') % 2:
+				continue
+			if not record.strip():
+				record = ''
+				continue
+			try:
+				row = next(csv.reader([record]))
+			except csv.Error as e:
+				raise ValueError(f'Row {row_number + 1} is not valid CSV ({e}).')
+			record = ''
+			row_number += 1
+			if row_number == 1 and row == list(columns):
+				continue
+			yield cls._check_row(row, columns, row_number)
+		if record.strip():
+			raise ValueError('The file ends inside of a quoted value.')
+	
+	@classmethod
+	async def _parse_json(cls, chunks, columns):
+		"""
+		Yields the rows of a JSON file from an async iterator of its text.
+		
+		The file can either be a JSON array of rows or have one JSON row per line.
+		Rows are decoded as soon as they are complete, the whole file is never held at once.
+		"""
+		decoder = json.JSONDecoder()
+		buffer = ''
+		pos = 0
+		in_array = None
+		finished = False
+		row_number = 0
+		async for chunk in chunks:
+			buffer = buffer[pos:] + chunk
+			pos = 0
+			while True:
+				while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+					pos += 1
+				if pos == len(buffer) or finished:
+					break
+				if in_array is None:
+					if buffer[pos] != '[':
+						in_array = False
+					else:
+						#an array of rows starts with `[[` or `[{`, a row per line starts with `["`
+						ahead = buffer[pos + 1:].lstrip()
+						if not ahead:
+							break
+						in_array = ahead[0] in '[{]'
+						if in_array:
+							pos += 1
+							continue
+				if in_array and buffer[pos] == ']':
+					finished = True
+					pos += 1
+					break
+				try:
+					row, pos = decoder.raw_decode(buffer, pos)
+				except json.JSONDecodeError:
+					#the row is not complete yet
+					break
+				row_number += 1
+				yield cls._check_row(row, columns, row_number)
+		rest = buffer[pos:].strip(' \t\r\n,')
+		if rest or (in_array and not finished):
+			raise ValueError(f'Row {row_number + 1} is not valid JSON.')
+	
+	@listmaker.command()
+	async def show(self, ctx, list_name, show_index: bool=False, page: int=1):
 		"""
 		View the data of a list.
 		
 		Wrap the list name in quotes if it requires spaces.
 		Use the parameter `show_index` to enable list indexes.
+		Use the parameter `page` to start on a specific page.
 		
 		Example:
 		`[p]listmaker show "My friends"`
+		`[p]listmaker show "My friends" yes 5`
 		"""
-		lists = await self.config.lists()
-		if list_name not in lists:
+		if list_name not in await self.config.index():
 			await ctx.send('That list does not exist.')
 			return
-		if show_index:
-			show_index = range(1, len(lists[list_name]['data']) + 1)
-		data = lists[list_name]['data']
-		if lists[list_name].get('sort', None):
-			sort = lists[list_name]['sort']
+		key = (list_name, self._versions.get(list_name, 0), show_index)
+		table = self._render_cache.get(key)
+		if table is None:
+			table = await self._build_table(list_name, show_index)
+			self._cache_table(key, table)
+		else:
+			self._render_cache.move_to_end(key)
+		page = min(max(page, 1), table.page_count) - 1
+		if table.page_count == 1:
+			await ctx.send(table.format_page(0))
+			return
+		view = TableView(table, ctx.author, page)
+		view.message = await ctx.send(table.format_page(page), view=view)
+	
+	@listmaker.command()
+	async def find(self, ctx, list_name, column_name, value):
+		"""
+		Find the rows of a list where a column has a value.
+		
+		The row numbers shown can be used with `[p]listmaker remove`.
+		Wrap anything that requires spaces in quotes.
+		
+		Example:
+		`[p]listmaker find "My friends" name "Robert Smith"`
+		"""
+		await self._find(ctx, list_name, column_name, lambda index: index.find(value))
+	
+	@listmaker.command()
+	async def findprefix(self, ctx, list_name, column_name, prefix):
+		"""
+		Find the rows of a list where a column starts with some text.
+		
+		The row numbers shown can be used with `[p]listmaker remove`.
+		Wrap anything that requires spaces in quotes.
+		
+		Example:
+		`[p]listmaker findprefix "My friends" name Rob`
+		"""
+		await self._find(ctx, list_name, column_name, lambda index: index.find_prefix(prefix))
+	
+	@listmaker.command()
+	async def findrange(self, ctx, list_name, column_name, low, high):
+		"""
+		Find the rows of a list where a column is between two values, inclusive.
+		
+		Values are compared the same way as when sorting by the column, see `[p]listmaker type`.
+		The row numbers shown can be used with `[p]listmaker remove`.
+		Wrap anything that requires spaces in quotes.
+		
+		Example:
+		`[p]listmaker findrange "My friends" age 20 30`
+		"""
+		await self._find(ctx, list_name, column_name, lambda index: index.find_range(low, high))
+	
+	async def _find(self, ctx, list_name, column_name, search):
+		"""Shared code of the find commands, `search` takes a ColumnIndex and returns row indexes."""
+		if list_name not in await self.config.index():
+			await ctx.send('That list does not exist.')
+			return
+		lm = await self._get_list(list_name)
+		if column_name not in lm['columns']:
+			await ctx.send('That column could not be found.')
+			return
+		index = self._column_index(list_name, lm, lm['columns'].index(column_name))
+		found = search(index)
+		if not found:
+			await ctx.send('No rows matched.')
+			return
+		data = lm['data']
+		table = Table(f'{len(found)} matching rows', lm['columns'], [data[i] for i in found], [i + 1 for i in found])
+		if table.page_count == 1:
+			await ctx.send(table.format_page(0))
+			return
+		view = TableView(table, ctx.author)
+		view.message = await ctx.send(table.format_page(0), view=view)
+	
+	def _column_index(self, list_name, lm, column):
+		"""Returns the index of a column of a list, building it on first use."""
+		indexes = self._indexes.setdefault(list_name, {})
+		index = indexes.get(column)
+		if index is None:
+			key = self._sort_key(lm['types'].get(str(column)))
+			index = ColumnIndex(lm['data'], column, key)
+			indexes[column] = index
+		return index
+	
+	async def _build_table(self, list_name, show_index):
+		"""Prepares a list to be shown one page at a time."""
+		lm_list = await self._get_list(list_name)
+		data = lm_list['data']
+		index = range(1, len(data) + 1) if show_index else None
+		if lm_list['sort']:
+			order = lm_list['order']
+			if order is None or len(order) != len(data):
+				#lists sorted before the order was stored
+				self._build_order(lm_list)
+				order = lm_list['order']
+				self._save_later(list_name)
+			if lm_list['sort'][1]:
+				order = order[::-1]
 			if show_index:
-				#Sorts both lists by "data"
-				data, show_index = zip(*sorted(zip(data, show_index), key=lambda a: a[0][sort[0]], reverse=sort[1]))
-			else:
-				data = sorted(data, key=lambda a: a[sort[0]], reverse=sort[1])
-		msg = tabulate(data, headers=lists[list_name]['columns'], showindex=show_index)
-		header = lists[list_name].get('header', '')
-		header = header.replace('{date}', lists[list_name].get('last_update', '(Unknown date)'))
-		msg = header + '\n' + msg
-		paged = pagify(msg)
-		box_paged = (f'```\n{x}```' for x in paged)
-		await ctx.send_interactive(box_paged)
+				index = [i + 1 for i in order]
+			data = [data[i] for i in order]
+		else:
+			#copied so later changes to the list do not reach an open TableView
+			data = list(data)
+		header = lm_list['header']
+		header = header.replace('{date}', lm_list['last_update'] or '(Unknown date)')
+		return Table(header, lm_list['columns'], data, index)
+	
+	def _cache_table(self, key, table):
+		"""Stores a prepared table, evicting the least recently viewed ones past the size limit."""
+		if table.size > RENDER_CACHE_CHARS:
+			return
+		self._render_cache[key] = table
+		self._render_cache_chars += table.size
+		while self._render_cache_chars > RENDER_CACHE_CHARS:
+			_, old = self._render_cache.popitem(last=False)
+			self._render_cache_chars -= old.size
+	
+	def _changed(self, list_name):
+		"""Marks the rendered form of a list as outdated."""
+		self._versions[list_name] = self._versions.get(list_name, 0) + 1
+		for key in [key for key in self._render_cache if key[0] == list_name]:
+			self._render_cache_chars -= self._render_cache.pop(key).size
 	
 	@listmaker.command()
 	async def delete(self, ctx, list_name):
@@ -148,14 +874,20 @@ class ListMaker(commands.Cog):
 		Example:
 		`[p]listmaker delete "My friends"`
 		"""
-		async with self.config.lists() as lists:
-			if list_name not in lists:
+		async with self.config.index() as index:
+			if list_name not in index:
 				await ctx.send('That list does not exist.')
 				return
-			if lists[list_name]['author'] != ctx.author.id:
+			if index[list_name] != ctx.author.id:
 				await ctx.send('You do not own that list.')
 				return
-			del lists[list_name]
+			del index[list_name]
+		async with self._locks[list_name]:
+			self._lists.pop(list_name, None)
+			self._dirty.discard(list_name)
+			self._indexes.pop(list_name, None)
+			await self.config.custom('LIST', list_name).clear()
+		self._changed(list_name)
 		await ctx.send(f'List {list_name} deleted.')
 	
 	@listmaker.command()
@@ -166,13 +898,13 @@ class ListMaker(commands.Cog):
 		Also shows the user id of the author of each list.
 		Use the parameter `show_all` to see all lists.
 		"""
-		lists = await self.config.lists()
-		if not lists:
+		index = await self.config.index()
+		if not index:
 			await ctx.send('There are currently no lists.')
 			return
 		data = [
-			[name, lists[name]['author']] for name in lists
-			if lists[name]['author'] == ctx.author.id or show_all
+			[name, author] for name, author in index.items()
+			if author == ctx.author.id or show_all
 		]
 		msg = tabulate(data, headers=['List Name', 'Author ID'])
 		paged = pagify(msg)
@@ -186,22 +918,21 @@ class ListMaker(commands.Cog):
 		
 		Wrap the list name in quotes if it requires spaces.
 		"""
-		async with self.config.lists() as lists:
-			if list_name not in lists:
-				await ctx.send('That list does not exist.')
-				return
-			if lists[list_name]['author'] != ctx.author.id:
-				await ctx.send('You do not own that list.')
-				return
-			if 'roles' not in lists[list_name]:
-				lists[list_name]['roles'] = [role_id]
-				await ctx.send('Added.')
-				return
-			if role_id in lists[list_name]['roles']:
-				lists[list_name]['roles'].remove(role_id)
+		index = await self.config.index()
+		if list_name not in index:
+			await ctx.send('That list does not exist.')
+			return
+		if index[list_name] != ctx.author.id:
+			await ctx.send('You do not own that list.')
+			return
+		lm = await self._get_list(list_name)
+		async with self._locks[list_name]:
+			self._save_later(list_name)
+			if role_id in lm['roles']:
+				lm['roles'].remove(role_id)
 				await ctx.send('Removed.')
 				return
-			lists[list_name]['roles'].append(role_id)
+			lm['roles'].append(role_id)
 		await ctx.send('Added.')
 
 	@listmaker.command()
@@ -212,24 +943,109 @@ class ListMaker(commands.Cog):
 		Wrap anything that requires spaces in quotes.
 		Use the parameter `reverse` to sort the other way.
 		"""
-		async with self.config.lists() as lists:
-			if list_name not in lists:
-				await ctx.send('That list does not exist.')
-				return
-			if not self._user_can_access(lists[list_name], ctx.author):
-				await ctx.send('You do not have permission to edit that list.')
-				return
-			if column_name is None:
-				lists[list_name]['sort'] = None
-				await ctx.send('Sorting disabled.')
-				return
-			if column_name not in lists[list_name]['columns']:
-				await ctx.send('That column could not be found.')
-				return
-			idx = lists[list_name]['columns'].index(column_name)
-			lists[list_name]['sort'] = [idx, reverse]
+		lm = await self._get_editable(ctx, list_name)
+		if lm is None:
+			return
+		if column_name is None:
+			async with self._locks[list_name]:
+				lm['sort'] = None
+				lm['order'] = None
+				self._save_later(list_name)
+			self._changed(list_name)
+			await ctx.send('Sorting disabled.')
+			return
+		if column_name not in lm['columns']:
+			await ctx.send('That column could not be found.')
+			return
+		async with self._locks[list_name]:
+			lm['sort'] = [lm['columns'].index(column_name), reverse]
+			self._build_order(lm)
+			self._save_later(list_name)
+		self._changed(list_name)
 		await ctx.send(f'The list will now be sorted by column {column_name}.')
+	
+	@listmaker.command(name='type')
+	async def type_(self, ctx, list_name, column_name, column_type='text'):
+		"""
+		Set how a column is compared when a list is sorted by it.
+		
+		`column_type` can be `text`, `number` or `date`.
+		Dates should be written as YYYY-MM-DD. Values that do not fit the type are sorted last.
+		Wrap anything that requires spaces in quotes.
+		
+		Example:
+		`[p]listmaker type "My friends" age number`
+		"""
+		column_type = column_type.lower()
+		if column_type not in ('text', 'number', 'date'):
+			await ctx.send('The column type must be `text`, `number` or `date`.')
+			return
+		lm = await self._get_editable(ctx, list_name)
+		if lm is None:
+			return
+		if column_name not in lm['columns']:
+			await ctx.send('That column could not be found.')
+			return
+		idx = lm['columns'].index(column_name)
+		async with self._locks[list_name]:
+			lm['types'][str(idx)] = column_type
+			self._indexes.get(list_name, {}).pop(idx, None)
+			if lm['sort'] and lm['sort'][0] == idx:
+				self._build_order(lm)
+			self._save_later(list_name)
+		self._changed(list_name)
+		await ctx.send(f'Column {column_name} will now be sorted as {column_type}.')
 			
+	@listmaker.command()
+	async def storage(self, ctx, list_name, storage_format):
+		"""
+		Set how the data of a list is stored.
+		
+		`rows` stores each row separately.
+		`columns` stores each column as one array, with repeated values stored once,
+		which takes less space for large lists with many repeated values.
+		This does not change how the list is used.
+		
+		Example:
+		`[p]listmaker storage "My friends" columns`
+		"""
+		storage_format = storage_format.lower()
+		if storage_format not in ('rows', 'columns'):
+			await ctx.send('The storage format must be `rows` or `columns`.')
+			return
+		index = await self.config.index()
+		if list_name not in index:
+			await ctx.send('That list does not exist.')
+			return
+		lm_list = self.config.custom('LIST', list_name)
+		async with self._locks[list_name]:
+			lm = self._lists.get(list_name)
+			loaded = lm is not None
+			if not loaded:
+				#converted without being kept in memory
+				lm = await self._load_list(lm_list)
+			if not self._user_can_access(index[list_name], lm['roles'], ctx.author):
+				await ctx.send('You do not have permission to edit that list.')
+				return
+			#only whether it is None matters until the list is written, see _save_list
+			marker = [] if storage_format == 'columns' else None
+			lm['columnar'] = marker
+			stored = await self._save_list(lm_list, lm)
+			if loaded:
+				#every pending change was just written
+				self._dirty.discard(list_name)
+			elif list_name in self._lists:
+				#loaded by another command while this one was reading the list
+				self._lists[list_name]['columnar'] = marker
+		if storage_format == 'rows':
+			await ctx.send('The list is now stored as rows.')
+			return
+		encoded = sum('codes' in column for column in stored['columnar'])
+		await ctx.send(
+			f'The list is now stored as columns. '
+			f'{encoded} of {len(stored["columnar"])} columns store their repeated values once.'
+		)
+	
 	@listmaker.command()
 	async def header(self, ctx, list_name, text=None):
 		"""
@@ -238,31 +1054,188 @@ class ListMaker(commands.Cog):
 		Wrap anything that requires spaces in quotes.
 		The text `{date}` will be replaced by the date the list was last updated.
 		"""
-		async with self.config.lists() as lists:
-			if list_name not in lists:
-				await ctx.send('That list does not exist.')
-				return
-			if not self._user_can_access(lists[list_name], ctx.author):
-				await ctx.send('You do not have permission to edit that list.')
-				return
-			if text is None:
-				lists[list_name]['header'] = ''
-				await ctx.send('Removed the header.')
-				return
-			lists[list_name]['header'] = text
+		lm = await self._get_editable(ctx, list_name)
+		if lm is None:
+			return
+		async with self._locks[list_name]:
+			lm['header'] = text or ''
+			self._save_later(list_name)
+		self._changed(list_name)
+		if text is None:
+			await ctx.send('Removed the header.')
+			return
 		await ctx.send(f'The list will now have the header {text}.')
 
+	async def _get_editable(self, ctx, list_name):
+		"""
+		Returns the in memory copy of a list the author of `ctx` can edit.
+		
+		Sends an error message and returns None if the list does not exist or cannot be edited.
+		"""
+		index = await self.config.index()
+		if list_name not in index:
+			await ctx.send('That list does not exist.')
+			return None
+		lm = await self._get_list(list_name)
+		if not self._user_can_access(index[list_name], lm['roles'], ctx.author):
+			await ctx.send('You do not have permission to edit that list.')
+			return None
+		return lm
+	
 	@staticmethod
-	def _user_can_access(lm_list, user):
+	def _user_can_access(author_id, list_roles, user):
 		"""Determine if a user can edit a list."""
-		if lm_list['author'] == user.id:
+		if author_id == user.id:
 			return True
-		list_roles = lm_list.get('roles', [])
 		user_roles = (r.id for r in getattr(user, 'roles', []))
 		if any(rid in list_roles for rid in user_roles):
 			return True
 		return False
 	
+	@classmethod
+	async def _load_list(cls, lm_list):
+		"""Reads a list, converting its data back to rows if it is stored as columns."""
+		lm = await lm_list.all()
+		if lm['columnar'] is not None:
+			lm['data'] = cls._decode_columns(lm['columnar'])
+			#the encoding is rebuilt from `data` by _save_list, so it is not kept twice
+			lm['columnar'] = []
+		return lm
+	
+	@classmethod
+	async def _save_list(cls, lm_list, lm):
+		"""Writes a list read by _load_list, in the format its data is stored in, returning what was written."""
+		lm = dict(lm)
+		if lm['columnar'] is not None:
+			lm['columnar'] = cls._encode_columns(lm['data'], len(lm['columns']))
+			lm['data'] = []
+		await lm_list.set(lm)
+		return lm
+	
+	async def _get_list(self, list_name):
+		"""Returns the in memory copy of a list, loading it from config on first use."""
+		lm = self._lists.get(list_name)
+		if lm is None:
+			lm = await self._load_list(self.config.custom('LIST', list_name))
+			lm = self._lists.setdefault(list_name, lm)
+		return lm
+	
+	def _save_later(self, list_name):
+		"""Marks a list as changed, to be written to config with any other changes after FLUSH_DELAY."""
+		self._dirty.add(list_name)
+		if self._flush_task is None:
+			self._flush_task = asyncio.create_task(self._flush_later())
+	
+	async def _flush_later(self):
+		await asyncio.sleep(FLUSH_DELAY)
+		self._flush_task = None
+		await self._flush()
+	
+	async def _flush(self):
+		"""Writes every changed list to config."""
+		while self._dirty:
+			list_name = self._dirty.pop()
+			async with self._locks[list_name]:
+				lm = self._lists.get(list_name)
+				if lm is not None:
+					await self._save_list(self.config.custom('LIST', list_name), lm)
+	
+	@staticmethod
+	def _encode_columns(rows, width):
+		"""
+		Converts rows to one array per column.
+		
+		Columns where at least half of the values are repeats are stored as a dictionary of their
+		distinct values and the code (position in the dictionary) of each value.
+		"""
+		columns = []
+		for col in range(width):
+			values = [row[col] for row in rows]
+			dictionary = {}
+			codes = [dictionary.setdefault(value, len(dictionary)) for value in values]
+			if len(dictionary) * 2 <= len(values):
+				columns.append({'dictionary': list(dictionary), 'codes': codes})
+			else:
+				columns.append({'values': values})
+		return columns
+	
+	@staticmethod
+	def _decode_columns(columns):
+		"""Converts columns made by _encode_columns back to rows."""
+		arrays = []
+		for column in columns:
+			if 'codes' in column:
+				dictionary = column['dictionary']
+				arrays.append([dictionary[code] for code in column['codes']])
+			else:
+				arrays.append(column['values'])
+		return [list(row) for row in zip(*arrays)]
+	
+	@staticmethod
+	def _sort_key(column_type):
+		"""Returns a function that turns a value of a column with the given type in to a sort key."""
+		if column_type == 'number':
+			def key(value):
+				try:
+					number = float(value.replace(',', ''))
+				except ValueError:
+					return (1, value)
+				if not math.isfinite(number):
+					return (1, value)
+				return (0, number)
+		elif column_type == 'date':
+			def key(value):
+				try:
+					return (0, datetime.date.fromisoformat(value).toordinal())
+				except ValueError:
+					return (1, value)
+		else:
+			def key(value):
+				return (0, value)
+		return key
+	
+	@classmethod
+	def _build_order(cls, lm):
+		"""Sorts the row indexes of a list from scratch, storing them as `lm['order']`."""
+		if not lm['sort']:
+			lm['order'] = None
+			return
+		col = lm['sort'][0]
+		key = cls._sort_key(lm['types'].get(str(col)))
+		data = lm['data']
+		lm['order'] = sorted(range(len(data)), key=lambda i: key(data[i][col]))
+	
+	@classmethod
+	def _insert_order(cls, lm, row_indexes):
+		"""Inserts newly added rows in to the sorted order of a list using binary search."""
+		if not lm['sort']:
+			return
+		order = lm['order']
+		if order is None or len(order) + len(row_indexes) != len(lm['data']) or len(row_indexes) > len(order) // 4:
+			#re-sorting is cheaper for large batches
+			cls._build_order(lm)
+			return
+		col = lm['sort'][0]
+		key = cls._sort_key(lm['types'].get(str(col)))
+		data = lm['data']
+		for i in row_indexes:
+			value = key(data[i][col])
+			lo, hi = 0, len(order)
+			while lo < hi:
+				mid = (lo + hi) // 2
+				if value < key(data[order[mid]][col]):
+					hi = mid
+				else:
+					lo = mid + 1
+			order.insert(lo, i)
+	
+	@staticmethod
+	def _remove_order(lm, row_index):
+		"""Removes a deleted row from the sorted order of a list, shifting the indexes after it."""
+		if lm['order'] is None:
+			return
+		lm['order'] = [i - (i > row_index) for i in lm['order'] if i != row_index]
+	
 	@staticmethod
 	def _date_formatted():
 		"""Returns the current date formatted as YYY-MM-DD"""
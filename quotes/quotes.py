@@ -4,10 +4,15 @@ from redbot.core import commands
 from redbot.core import Config
 from redbot.core import checks
 from redbot.core.utils.chat_formatting import pagify
-from redbot.core.utils.menus import menu, close_menu, DEFAULT_CONTROLS
 from typing import Union
 import asyncio
+import collections
+import csv
+import io
+import json
+import math
 import random
+import re
 
 
 class CustomMember(commands.Converter):
@@ -24,6 +29,145 @@ class CustomMember(commands.Converter):
 		return result
 
 
+class SearchIndex:
+	"""
+	An inverted index of the words in the quotes of a guild.
+	
+	`terms` maps each word to the ids of the quotes it appears in and how often it appears in each.
+	"""
+	WORD = re.compile(r'\w+')
+	
+	def __init__(self, quotes):
+		self.terms = {}
+		self.size = 0
+		for quote_id, quote in quotes.items():
+			self.add(quote_id, quote['text'])
+	
+	@classmethod
+	def tokenize(cls, text):
+		return cls.WORD.findall(text.casefold())
+	
+	def add(self, quote_id, text):
+		self.size += 1
+		for word in self.tokenize(text):
+			ids = self.terms.setdefault(word, {})
+			ids[quote_id] = ids.get(quote_id, 0) + 1
+	
+	def remove(self, quote_id, text):
+		self.size -= 1
+		for word in set(self.tokenize(text)):
+			ids = self.terms.get(word)
+			if ids is None:
+				continue
+			ids.pop(quote_id, None)
+			if not ids:
+				del self.terms[word]
+	
+	def search(self, text):
+		"""
+		Returns the ids of the quotes containing any word of `text`, best matches first.
+		
+		Quotes matching more of the words rank higher, then quotes where the words are rarer
+		and appear more often (tf-idf), then newer quotes.
+		"""
+		scores = {}
+		for word in set(self.tokenize(text)):
+			ids = self.terms.get(word)
+			if not ids:
+				continue
+			idf = math.log(1 + self.size / len(ids))
+			for quote_id, count in ids.items():
+				matched, score = scores.get(quote_id, (0, 0.0))
+				scores[quote_id] = (matched + 1, score + count * idf)
+		return sorted(scores, key=lambda quote_id: (scores[quote_id], int(quote_id)), reverse=True)
+
+
+class QuoteSource:
+	"""
+	The quotes shown by a QuoteMenu, in the order of `quote_ids`.
+	
+	Embeds are only built when their page is shown,
+	the most recent `window` of them are kept so paging back and forth does not rebuild them.
+	"""
+	def __init__(self, cog, ctx, quote_ids, window=5):
+		self.cog = cog
+		self.ctx = ctx
+		self.quote_ids = quote_ids
+		self.window = window
+		self._embeds = collections.OrderedDict()
+	
+	def __len__(self):
+		return len(self.quote_ids)
+	
+	async def get_page(self, page):
+		quote_id = self.quote_ids[page]
+		embed = self._embeds.get(quote_id)
+		if embed is not None:
+			self._embeds.move_to_end(quote_id)
+			return embed
+		try:
+			quote = await self.cog.config.guild(self.ctx.guild).quotes.get_raw(quote_id)
+		except KeyError:
+			embed = discord.Embed(title='Quote #{0}'.format(quote_id), description='This quote was deleted.')
+		else:
+			embed = await self.cog._build_quote(self.ctx, quote, quote_id)
+		self._embeds[quote_id] = embed
+		if len(self._embeds) > self.window:
+			self._embeds.popitem(last=False)
+		return embed
+
+
+class QuoteMenu(discord.ui.View):
+	"""Buttons to move through the pages of a QuoteSource."""
+	def __init__(self, source, author):
+		super().__init__(timeout=60)
+		self.source = source
+		self.author = author
+		self.page = 0
+		self.message = None
+		if len(source) == 1:
+			self.remove_item(self.previous)
+			self.remove_item(self.next)
+	
+	async def start(self, ctx):
+		self.message = await ctx.send(embed=await self.source.get_page(self.page), view=self)
+	
+	async def interaction_check(self, interaction):
+		if interaction.user.id != self.author.id:
+			await interaction.response.send_message('You are not allowed to use this menu.', ephemeral=True)
+			return False
+		return True
+	
+	async def on_timeout(self):
+		try:
+			await self.message.edit(view=None)
+		except discord.HTTPException:
+			pass
+	
+	async def _show_page(self, interaction):
+		embed = await self.source.get_page(self.page)
+		await interaction.response.edit_message(embed=embed, view=self)
+	
+	@discord.ui.button(emoji='\N{LEFTWARDS BLACK ARROW}', style=discord.ButtonStyle.grey)
+	async def previous(self, interaction, button):
+		self.page = (self.page - 1) % len(self.source)
+		await self._show_page(interaction)
+	
+	@discord.ui.button(emoji='\N{CROSS MARK}', style=discord.ButtonStyle.grey)
+	async def close(self, interaction, button):
+		self.stop()
+		await interaction.response.defer()
+		try:
+			await interaction.message.delete()
+		except discord.HTTPException:
+			pass
+	
+	@discord.ui.button(emoji='\N{BLACK RIGHTWARDS ARROW}', style=discord.ButtonStyle.grey)
+	async def next(self, interaction, button):
+		self.page = (self.page + 1) % len(self.source)
+		await self._show_page(interaction)
+
+
 class Quotes(commands.Cog):
 	"""Store and display quotes."""
 	def __init__(self, bot):
@@ -33,6 +177,12 @@ class Quotes(commands.Cog):
 			next_index = 1,
 			quotes = {}
 		)
+		#guild id -> author id -> ids of their quotes, see _get_authors
+		self._authors = {}
+		#guild id -> SearchIndex, built on the first search of a guild
+		self._search = {}
+		#guild id -> lock held while quotes are added or deleted and while the indexes are built
+		self._locks = collections.defaultdict(asyncio.Lock)
 	
 	@commands.guild_only()
 	@commands.bot_has_permissions(embed_links=True)
@@ -44,36 +194,142 @@ class Quotes(commands.Cog):
 		Use the optional parameter quote_id to specify a quote to view or to view a random quote from a specific member.
 		If no id is provided, a random quote will be sent.
 		"""
-		quotes = await self.config.guild(ctx.guild).quotes()
-		if not quotes:
+		authors = await self._get_authors(ctx.guild)
+		if not authors:
 			return await ctx.send('There are no saved quotes.')
 		if isinstance(quote_id, str):
 			return await ctx.send('The quote id must be a number or member.')
 		if quote_id is None or isinstance(quote_id, discord.Member):
-			embed_list = []
-			for index in quotes:
-				if quote_id is None or quotes[index]['author'] == quote_id.id:
-					embed_list.append(await self._build_quote(ctx, quotes[index], index))
-			if not embed_list:
+			if quote_id is None:
+				quote_ids = [index for ids in authors.values() for index in ids]
+			else:
+				quote_ids = list(authors.get(quote_id.id, ()))
+			if not quote_ids:
 				return await ctx.send('That member does not have any quotes.')
-			random.shuffle(embed_list)
-			c = DEFAULT_CONTROLS if len(embed_list) > 1 else {"\N{CROSS MARK}": close_menu}
-			return await menu(ctx, embed_list, c)
+			random.shuffle(quote_ids)
+			return await QuoteMenu(QuoteSource(self, ctx, quote_ids), ctx.author).start(ctx)
 		quote_id = str(quote_id)
-		if quote_id not in quotes:
+		try:
+			quote = await self.config.guild(ctx.guild).quotes.get_raw(quote_id)
+		except KeyError:
 			return await ctx.send('That quote could not be found.')
-		quote = quotes[quote_id]
 		embed = await self._build_quote(ctx, quote, quote_id)
 		await ctx.send(embed=embed)
 	
 	@quote.command()
 	async def add(self, ctx, text: str, author: CustomMember):
 		"""Add a new quote."""
-		index = await self.config.guild(ctx.guild).next_index()
-		await self.config.guild(ctx.guild).quotes.set_raw(index, 'text', value=text)
-		await self.config.guild(ctx.guild).quotes.set_raw(index, 'author', value=author.id)
+		index = await self._insert_quotes(ctx.guild, [{'text': text, 'author': author.id}])
 		await ctx.send('Quote added as #{0}.'.format(index))
-		await self.config.guild(ctx.guild).next_index.set(index + 1)
+	
+	@checks.mod()
+	@quote.command(name='import')
+	async def import_(self, ctx):
+		"""
+		Add quotes from an attached JSON or CSV file.
+		
+		JSON files should hold an array of quotes, each either `{"text": ..., "author": user id}` or `[text, user id]`.
+		CSV files should have the text and the user id of the author on each line.
+		The quotes are numbered in the order they appear, nothing is added if any quote is invalid.
+		"""
+		if not ctx.message.attachments:
+			return await ctx.send('Attach a JSON or CSV file to import.')
+		attachment = ctx.message.attachments[0]
+		filename = attachment.filename.lower()
+		if not filename.endswith(('.json', '.csv')):
+			return await ctx.send('The attached file must be a `.json` or `.csv` file.')
+		try:
+			text = (await attachment.read()).decode('utf-8-sig')
+		except discord.HTTPException:
+			return await ctx.send('I could not download that file.')
+		except UnicodeDecodeError:
+			return await ctx.send('That file is not valid UTF-8 text.')
+		try:
+			if filename.endswith('.json'):
+				new_quotes = self._parse_json(text)
+			else:
+				new_quotes = self._parse_csv(text)
+		except ValueError as e:
+			return await ctx.send('Nothing was imported. {0}'.format(e))
+		if not new_quotes:
+			return await ctx.send('That file does not contain any quotes.')
+		start = await self._insert_quotes(ctx.guild, new_quotes)
+		await ctx.send('Imported {0} quotes as #{1} to #{2}.'.format(
+			len(new_quotes), start, start + len(new_quotes) - 1
+		))
+	
+	@staticmethod
+	def _check_quote(text, author, number):
+		"""Converts a parsed quote to the stored format, raising ValueError if it is invalid."""
+		if not isinstance(text, str) or not text.strip():
+			raise ValueError('Quote {0} has no text.'.format(number))
+		#the embed description wraps the text in quotes, so 2 of its 4096 characters are taken
+		if len(text) > 4094:
+			raise ValueError('Quote {0} is longer than 4094 characters.'.format(number))
+		#json booleans would otherwise become the user ids 1 and 0
+		if isinstance(author, bool):
+			raise ValueError('Quote {0} does not have a valid user id.'.format(number))
+		try:
+			author = int(author)
+		except (TypeError, ValueError):
+			raise ValueError('Quote {0} does not have a valid user id.'.format(number))
+		return {'text': text, 'author': author}
+	
+	@classmethod
+	def _parse_json(cls, text):
+		"""Reads the quotes of a JSON file."""
+		try:
+			data = json.loads(text)
+		except json.JSONDecodeError as e:
+			raise ValueError('That file is not valid JSON: {0}'.format(e))
+		if not isinstance(data, list):
+			raise ValueError('The file should hold an array of quotes.')
+		new_quotes = []
+		for number, quote in enumerate(data, 1):
+			if isinstance(quote, dict):
+				quote = (quote.get('text'), quote.get('author'))
+			if not isinstance(quote, (list, tuple)) or len(quote) != 2:
+				raise ValueError('Quote {0} should have a text and an author.'.format(number))
+			new_quotes.append(cls._check_quote(*quote, number))
+		return new_quotes
+	
+	@classmethod
+	def _parse_csv(cls, text):
+		"""Reads the quotes of a CSV file."""
+		new_quotes = []
+		for number, row in enumerate(csv.reader(io.StringIO(text)), 1):
+			if not row:
+				continue
+			if number == 1 and [c.strip().lower() for c in row] == ['text', 'author']:
+				continue
+			if len(row) != 2:
+				raise ValueError('Line {0} should have a text and an author.'.format(number))
+			new_quotes.append(cls._check_quote(*row, number))
+		return new_quotes
+	
+	async def _insert_quotes(self, guild, new_quotes):
+		"""
+		Stores new quotes under contiguous ids, returning the first id.
+		
+		Ids are given out while holding the lock of the guild, so concurrent adds never share an id.
+		"""
+		async with self._locks[guild.id]:
+			start = await self.config.guild(guild).next_index()
+			if len(new_quotes) == 1:
+				await self.config.guild(guild).quotes.set_raw(str(start), value=new_quotes[0])
+			else:
+				async with self.config.guild(guild).quotes() as quotes:
+					for index, quote in enumerate(new_quotes, start):
+						quotes[str(index)] = quote
+			await self.config.guild(guild).next_index.set(start + len(new_quotes))
+			authors = self._authors.get(guild.id)
+			search = self._search.get(guild.id)
+			for index, quote in enumerate(new_quotes, start):
+				if authors is not None:
+					authors.setdefault(quote['author'], set()).add(str(index))
+				if search is not None:
+					search.add(str(index), quote['text'])
+		return start
 	
 	@checks.mod()
 	@quote.command()
@@ -81,28 +337,141 @@ class Quotes(commands.Cog):
 		"""Delete an existing quote."""
 		if not quote_id.isdigit():
 			return await ctx.send('The quote id needs to be a number.')
-		async with self.config.guild(ctx.guild).quotes() as quotes:
-			if quote_id in quotes:
-				del quotes[quote_id]
-				return await ctx.send('Quote #{0} was deleted successfully.'.format(quote_id))
+		async with self._locks[ctx.guild.id]:
+			async with self.config.guild(ctx.guild).quotes() as quotes:
+				quote = quotes.pop(quote_id, None)
+			if quote is not None:
+				self._forget_quote(ctx.guild, quote, quote_id)
+		if quote is not None:
+			return await ctx.send('Quote #{0} was deleted successfully.'.format(quote_id))
 		await ctx.send('That quote could not be found.')
 	
 	@quote.command()
-	async def all(self, ctx):
-		"""Receive a DM with every quote."""
+	async def all(self, ctx, file_format: str=None):
+		"""
+		Receive a DM with every quote.
+		
+		Use the optional parameter file_format (`txt` or `json`) to receive every quote as a single file instead.
+		"""
+		if file_format is not None:
+			file_format = file_format.lower()
+			if file_format not in ('txt', 'json'):
+				return await ctx.send('The file format must be `txt` or `json`.')
 		quotes = await self.config.guild(ctx.guild).quotes()
-		msg = ''
-		for index in quotes:
-			author = ctx.guild.get_member(quotes[index]['author'])
-			if author:
-				author = author.display_name
-			else:
-				author = 'Unknown'
-			msg += '{index}. "{quote}" -{author}\n'.format(
-				index=index, quote=quotes[index]['text'], author=author
+		if not quotes:
+			return await ctx.send('There are no saved quotes.')
+		if file_format is None:
+			return await self.member_send_interactive(ctx, self._pages(self._quote_lines(ctx.guild, quotes)))
+		fp = io.StringIO()
+		if file_format == 'txt':
+			fp.writelines(self._quote_lines(ctx.guild, quotes))
+		else:
+			#the same format quote import accepts
+			json.dump([{'id': int(index), **quote} for index, quote in quotes.items()], fp, indent=1)
+		data = io.BytesIO(fp.getvalue().encode('utf-8'))
+		del fp
+		try:
+			await ctx.author.send(file=discord.File(data, filename='quotes.{0}'.format(file_format)))
+		except discord.HTTPException:
+			await ctx.send('I could not send you that file.')
+	
+	@staticmethod
+	def _quote_lines(guild, quotes):
+		"""Yields a line of text for each quote."""
+		names = {}
+		for index, quote in quotes.items():
+			author_id = quote['author']
+			if author_id not in names:
+				member = guild.get_member(author_id)
+				names[author_id] = member.display_name if member else 'Unknown'
+			yield '{index}. "{quote}" -{author}\n'.format(
+				index=index, quote=quote['text'], author=names[author_id]
 			)
-		quote_list = pagify(msg)
-		await self.member_send_interactive(ctx, quote_list)
+	
+	@staticmethod
+	def _pages(lines, page_length=2000):
+		"""Groups lines in to pages of at most page_length characters, one page at a time."""
+		page = []
+		size = 0
+		for line in lines:
+			if page and size + len(line) > page_length:
+				yield ''.join(page)
+				page = []
+				size = 0
+			if len(line) > page_length:
+				yield from pagify(line, page_length=page_length)
+				continue
+			page.append(line)
+			size += len(line)
+		if page:
+			yield ''.join(page)
+	
+	@quote.command()
+	async def search(self, ctx, *, terms: str):
+		"""
+		Find quotes containing some words.
+		
+		Quotes containing more of the words are shown first.
+		"""
+		async with self._locks[ctx.guild.id]:
+			search = self._search.get(ctx.guild.id)
+			if search is None:
+				search = SearchIndex(await self.config.guild(ctx.guild).quotes())
+				self._search[ctx.guild.id] = search
+		quote_ids = search.search(terms)
+		if not quote_ids:
+			return await ctx.send('No quotes matched.')
+		await QuoteMenu(QuoteSource(self, ctx, quote_ids), ctx.author).start(ctx)
+	
+	@quote.command()
+	async def stats(self, ctx):
+		"""See how many quotes each member has."""
+		authors = await self._get_authors(ctx.guild)
+		if not authors:
+			return await ctx.send('There are no saved quotes.')
+		counts = sorted(((len(ids), author_id) for author_id, ids in authors.items()), reverse=True)
+		lines = []
+		for place, (count, author_id) in enumerate(counts[:10], 1):
+			member = ctx.guild.get_member(author_id)
+			name = member.display_name if member else 'Unknown ({0})'.format(author_id)
+			lines.append('{place}. {name}: {count}'.format(place=place, name=name, count=count))
+		embed = discord.Embed(
+			title='Most quoted members',
+			description='\n'.join(lines),
+			color=await ctx.embed_color()
+		)
+		embed.set_footer(text='{0} quotes from {1} members'.format(
+			sum(count for count, _ in counts), len(counts)
+		))
+		await ctx.send(embed=embed)
+	
+	async def _get_authors(self, guild):
+		"""
+		Returns a dict of author id -> ids of their quotes for a guild.
+		
+		Built from config the first time a guild is used, then kept up to date by add and delete.
+		"""
+		async with self._locks[guild.id]:
+			authors = self._authors.get(guild.id)
+			if authors is None:
+				quotes = await self.config.guild(guild).quotes()
+				authors = {}
+				for index, quote in quotes.items():
+					authors.setdefault(quote['author'], set()).add(index)
+				self._authors[guild.id] = authors
+		return authors
+	
+	def _forget_quote(self, guild, quote, quote_id):
+		"""Removes a deleted quote from the author and search indexes of its guild."""
+		if guild.id in self._search:
+			self._search[guild.id].remove(quote_id, quote['text'])
+		authors = self._authors.get(guild.id)
+		author_id = quote['author']
+		if authors is None or author_id not in authors:
+			return
+		authors[author_id].discard(quote_id)
+		if not authors[author_id]:
+			del authors[author_id]
 	
 	async def _build_quote(self, ctx, quote: dict, index: str):
 		"""Creates a pretty embed for the quote."""
@@ -116,44 +485,36 @@ class Quotes(commands.Cog):
 			embed = embed.set_footer(text=author.display_name, icon_url=author.display_avatar.url)
 		return embed
 
-	async def member_send_interactive(self, ctx, messages: list):
+	async def member_send_interactive(self, ctx, messages):
 		"""
 		Functionality of ctx.send_interactive but to a discord.Member
 		
 		Copied & modified from redbot.core.commands.context
+		Pages are taken from `messages` one at a time, so it can be a generator.
 		"""
-		messages = tuple(messages)
-		ret = []
-		for idx, page in enumerate(messages, 1):
-			msg = await ctx.author.send(page)
-			ret.append(msg)
-			n_remaining = len(messages) - idx
-			if n_remaining > 0:
-				if n_remaining == 1:
-					plural = ''
-					is_are = 'is'
-				else:
-					plural = 's'
-					is_are = 'are'
-				query = await ctx.author.send(
-					'There {} still {} message{} remaining. '
-					'Type `more` to continue.'.format(is_are, n_remaining, plural)
-                )
+		messages = iter(messages)
+		page = next(messages, None)
+		while page is not None:
+			await ctx.author.send(page)
+			page = next(messages, None)
+			if page is None:
+				break
+			query = await ctx.author.send('There are more messages remaining. Type `more` to continue.')
+			try:
+				await self.bot.wait_for(
+					'message',
+					check=lambda m: (
+						m.author.id == ctx.author.id
+						and m.channel == ctx.author.dm_channel
+						and m.content.lower() == 'more'
+					),
+					timeout=15
+				)
+			except asyncio.TimeoutError:
+				await query.delete()
+				break
+			else:
 				try:
-					resp = await self.bot.wait_for(
-						'message',
-						check=lambda m: (
-							m.author.id == ctx.author.id
-							and m.channel == ctx.author.dm_channel
-							and m.content.lower() == 'more'
-						),
-						timeout=15
-					)
-				except asyncio.TimeoutError:
 					await query.delete()
-					break
-				else:
-					try:
-						await query.delete()
-					except:
-						pass
+				except:
+					pass